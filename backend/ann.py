@@ -0,0 +1,191 @@
+"""Approximate nearest-neighbour indexes over the vector store (optional, needs faiss).
+
+Vectors are stored unit-length, so every index uses inner product, which equals
+cosine similarity. Index files are written next to the segment they were built
+from and are removed together with it.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+
+from backend.logger import get_logger
+
+logger = get_logger()
+
+ANN_TYPES = ("flat", "hnsw", "ivfpq")
+ADD_BATCH_SIZE = 65536
+# faiss k-means wants roughly this many training points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+
+
+def _faiss():
+    try:
+        import faiss
+    except ImportError:
+        return None
+    return faiss
+
+
+def index_type(config):
+    """Configured ANN type, or None for exact brute-force search."""
+    kind = config.get("ann_index", "none")
+    if kind == "none" and config.get("use_faiss", False):
+        kind = "flat"
+    return kind if kind in ANN_TYPES else None
+
+
+def index_path(store, kind):
+    return Path(store.folder) / f"{store.info['segment']}.{kind}.faiss"
+
+
+def _training_sample(store, size, seed=0):
+    if size >= len(store):
+        return np.ascontiguousarray(store.vectors, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(seed).choice(len(store), size, replace=False))
+    return np.ascontiguousarray(store.vectors[rows], dtype=np.float32)
+
+
+def _make_index(faiss, kind, store, config):
+    dim, count = store.dim, len(store)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.get("ann_hnsw_m", 32), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config.get("ann_ef_construction", 200)
+        return index
+    if kind == "ivfpq":
+        pq_m = config.get("ann_pq_m", 48)
+        nlist = min(config.get("ann_nlist", 1024), count // MIN_POINTS_PER_CENTROID)
+        if nlist < 1 or count < 256 or dim % pq_m:
+            logger.warning(f"Corpus too small or pq_m={pq_m} does not divide dim={dim}; using flat index instead of IVF-PQ")
+            return faiss.IndexFlatIP(dim)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(_training_sample(store, min(count, nlist * 256)))
+        return index
+    return faiss.IndexFlatIP(dim)
+
+
+def _read_for_update(faiss, path, store):
+    """Existing index for the segment being appended to, if it can be extended."""
+    if not path.exists():
+        return None
+    try:
+        index = faiss.read_index(str(path))
+    except RuntimeError:
+        return None
+    return index if index.ntotal <= len(store) else None
+
+
+def build_ann_index(store, config):
+    """Build (or extend) the configured index over all rows of `store` and write it next to the segment.
+
+    When the segment was appended to, vectors already in its index file are kept and
+    only the new rows are added; tombstoned rows stay in the index and are filtered
+    out at query time until the next compaction.
+    """
+    kind = index_type(config)
+    if kind is None or len(store) == 0:
+        return None
+    faiss = _faiss()
+    if faiss is None:
+        logger.warning("faiss is not installed; skipping ANN index build")
+        return None
+    path = index_path(store, kind)
+    index = _read_for_update(faiss, path, store)
+    if index is None:
+        logger.info(f"Building {kind} ANN index over {len(store)} vectors")
+        index = _make_index(faiss, kind, store, config)
+    else:
+        logger.info(f"Adding {len(store) - index.ntotal} vectors to {kind} ANN index")
+    for i in range(index.ntotal, len(store), ADD_BATCH_SIZE):
+        index.add(np.ascontiguousarray(store.vectors[i:i + ADD_BATCH_SIZE], dtype=np.float32))
+    # Readers may have the old file mapped; replace it rather than writing in place.
+    tmp = path.with_name(path.name + ".tmp")
+    faiss.write_index(index, str(tmp))
+    os.replace(tmp, path)
+    return path
+
+
+def configure_search(index, config):
+    """Apply query-time knobs (nprobe, efSearch) to a loaded index."""
+    faiss = _faiss()
+    ivf = faiss.try_extract_index_ivf(index) if faiss else None
+    if ivf is not None:
+        ivf.nprobe = config.get("ann_nprobe", 16)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = config.get("ann_ef_search", 64)
+    return index
+
+
+def load_ann_index(store, config):
+    """Memory-map the persisted index for `store`, or None to fall back to exact search."""
+    kind = index_type(config)
+    if kind is None or store is None or len(store) == 0:
+        return None
+    faiss = _faiss()
+    path = index_path(store, kind)
+    if faiss is None or not path.exists():
+        logger.warning(f"No {kind} ANN index for index v{store.version}; using exact search")
+        return None
+    try:
+        index = faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Not every index type supports mmap; read it into memory instead.
+        index = faiss.read_index(str(path))
+    if index.ntotal != len(store):
+        logger.warning(f"ANN index at {path} is stale; using exact search")
+        return None
+    return configure_search(index, config)
+
+
+def _selector_params(faiss, index, allowed):
+    """faiss SearchParameters restricting a search to the rows set in `allowed`.
+
+    Carries over the index's nprobe/efSearch, which per-call parameters would
+    otherwise reset. Returns (params, bitmap); the bitmap must outlive the search.
+    """
+    bitmap = np.packbits(allowed, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe), bitmap
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch), bitmap
+    return faiss.SearchParameters(sel=selector), bitmap
+
+
+def ann_candidates(index, query_embedding, k, live=None, allowed=None):
+    """Row ids of the k approximate nearest neighbours, best first, skipping tombstoned rows.
+
+    `allowed` (a row mask from a metadata filter, already excluding dead rows)
+    restricts the search itself, so filtered-out rows never take up the k slots.
+    """
+    return ann_candidates_batch(index, np.asarray(query_embedding).reshape(1, -1), k, live, allowed)[0]
+
+
+def ann_candidates_batch(index, query_embeddings, k, live=None, allowed=None):
+    """ann_candidates for many queries with a single index.search call; one id array per query."""
+    queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    ids = None
+    if allowed is not None:
+        live = allowed
+        faiss = _faiss()
+        try:
+            params, bitmap = _selector_params(faiss, index, allowed)
+            _, ids = index.search(queries, min(k, index.ntotal), params=params)
+        except (AttributeError, TypeError, RuntimeError) as e:
+            # faiss builds without search-time selectors: over-fetch and filter below.
+            logger.debug(f"ANN ID selector unavailable ({e}); filtering after search")
+    if ids is None:
+        if live is not None:
+            # Over-fetch so that dropping dead rows still leaves about k candidates.
+            k = min(index.ntotal, int(k * len(live) / max(int(live.sum()), 1)) + 1)
+        _, ids = index.search(queries, k)
+    results = []
+    for row in ids:
+        row = row[row >= 0]
+        if live is not None:
+            row = row[live[row]]
+        results.append(row)
+    return results
@@ -1,24 +1,48 @@
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os, json
+import time
+import asyncio
 import subprocess
 import platform
+import threading
 from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, Union
 
 from backend.config import load_config
-from backend.search import search
+from backend.engine import SearchEngine
+from backend.embedder import encode_queries, get_model
+from backend.jobs import ACTIVE_STATES, JobManager, JobStore
+from backend.logger import set_debug
+from backend import metrics
 
-model = None  # global model
+engine = None  # global search engine, holds the loaded index
+jobs = None  # background reindex jobs
+
+def _run_indexing(full=False, job=None):
+    from backend.indexer import run_indexing
+    return run_indexing(full=full, job=job)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global model
+    global engine, jobs
     config = load_config()
-    model = SentenceTransformer(config["embedding_model"])
+    set_debug(config.get("debug_logging", False))
+    if config.get("serve_workers", 1) > 1:
+        metrics.set_worker(os.getpid())
+    # Warm the embedding model in the background so /health answers right away;
+    # the first search waits for it if it isn't loaded yet.
+    threading.Thread(target=get_model, args=(config,), daemon=True).start()
+    engine = SearchEngine(config)
+    # Several workers (main.run) share job state through files, so any of them can answer for a job.
+    store = JobStore(config["index_folder"]) if config.get("serve_workers", 1) > 1 else None
+    jobs = JobManager(_run_indexing, on_success=lambda: engine.reload(), store=store)
     yield  # Application runs here
-    # Cleanup code (if needed) goes here
+    jobs.shutdown()
+    engine.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -28,8 +52,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+PROFILE_HEADER = "x-profile"
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """Request latency histogram; with an `X-Profile: 1` header, a Server-Timing breakdown of the request's stages."""
+    start = time.perf_counter()
+    if request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes"):
+        with metrics.profile() as breakdown:
+            response = await call_next(request)
+        elapsed = time.perf_counter() - start
+        stages = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in breakdown.items()]
+        response.headers["Server-Timing"] = ", ".join(stages + [f"total;dur={elapsed * 1000:.3f}"])
+    else:
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method,
+                                         route=route.path if route is not None else "unmatched",
+                                         status=response.status_code)
+    return response
+
 
 class SearchHit(BaseModel):
     filename: str
@@ -41,31 +87,137 @@ class SearchResponse(BaseModel):
 class FilePath(BaseModel):
     path: str
 
+class SearchFilters(BaseModel):
+    type: Optional[list[str]] = None  # extensions, e.g. ["pdf", "docx"]
+    path_prefix: Optional[str] = None  # relative to source_folder, e.g. "Invoices/"
+    modified_after: Optional[Union[float, str]] = None  # epoch seconds or ISO date
+    modified_before: Optional[Union[float, str]] = None
+    min_size: Optional[int] = None  # bytes
+    max_size: Optional[int] = None
+
+class BatchQuery(BaseModel):
+    q: str = Field(..., min_length=1)
+    top_k: int = Field(5, ge=1)
+    min_score: Optional[float] = None  # defaults to config min_score
+    filters: Optional[SearchFilters] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: list[BatchQuery]
+
+def _timestamp(value):
+    """Epoch seconds from a number or an ISO 8601 date/datetime string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"Invalid date: {value}")
+
+def _filters(filters: Optional[SearchFilters]):
+    if filters is None:
+        return None
+    filters = filters.dict()
+    filters["modified_after"] = _timestamp(filters["modified_after"])
+    filters["modified_before"] = _timestamp(filters["modified_before"])
+    return filters
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Counters and latency histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/search", response_model=dict)
-def search_endpoint(q: str = Query(..., min_length=1)):
-    config = load_config()
-    index_path = os.path.join(config["index_folder"], "embeddings.json")
-    if not os.path.exists(index_path):
+def search_endpoint(
+    q: str = Query(..., min_length=1),
+    type: Optional[list[str]] = Query(None),
+    path_prefix: Optional[str] = None,
+    modified_after: Optional[str] = None,
+    modified_before: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(5, ge=1, le=100),
+):
+    """Hybrid search; `offset`/`limit` page through the ranked hits, later pages come from the result cache."""
+    if not engine.ready:
         raise HTTPException(status_code=404, detail="Index not found. Please run /reindex.")
+    filters = _filters(SearchFilters(type=type, path_prefix=path_prefix, modified_after=modified_after,
+                                     modified_before=modified_before, min_size=min_size, max_size=max_size))
 
     try:
-        query_embedding = model.encode(q)
-        result = search(query_embedding, config, query=q)
+        result = engine.search_page(q, offset=offset, limit=limit, filters=filters)
+        metrics.SEARCH_QUERIES.inc(endpoint="search")
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
-@app.post("/reindex")
-def reindex():
-    from backend.indexer import run_indexing
-    count = run_indexing()
-    if count == 0:
-        return {"status": "No files to index."}
-    return {"status": f"{count} file{'s' if count != 1 else ''} indexed."}
+@app.post("/search/batch", response_model=dict)
+def search_batch_endpoint(request: BatchSearchRequest):
+    """Run many queries with one model.encode call and one pass over the index.
+
+    Results come back in request order, each shaped like a GET /search response.
+    """
+    if not engine.ready:
+        raise HTTPException(status_code=404, detail="Index not found. Please run /reindex.")
+    if not request.queries:
+        return {"results": []}
+    queries = [{**item.dict(), "filters": _filters(item.filters)} for item in request.queries]
+
+    try:
+        query_embeddings = encode_queries([item["q"] for item in queries], engine.config)
+        results = engine.search_batch(query_embeddings, queries)
+        metrics.SEARCH_QUERIES.inc(len(queries), endpoint="search_batch")
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@app.post("/reindex", status_code=202)
+def reindex(full: bool = False):
+    job, created = jobs.submit(full=full)
+    if not created:
+        raise HTTPException(status_code=409, detail={"message": "A reindex is already running.", **job.snapshot()})
+    return job.snapshot()
+
+def _get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reindex job.")
+    return job
+
+@app.get("/reindex/{job_id}")
+def reindex_status(job_id: str):
+    return _get_job(job_id).snapshot()
+
+@app.get("/reindex/{job_id}/events")
+async def reindex_events(job_id: str):
+    """Server-sent events with the job's progress until it finishes."""
+    job = _get_job(job_id)
+
+    async def stream():
+        current = job
+        while True:
+            # Looked up each time: under several workers, another process may be running the job.
+            current = jobs.get(job_id) or current
+            snapshot = current.snapshot()
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            if snapshot["state"] not in ACTIVE_STATES:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.delete("/reindex/{job_id}")
+def cancel_reindex(job_id: str):
+    _get_job(job_id)
+    return jobs.cancel(job_id).snapshot()
 
 @app.get("/config")
 def get_config():
@@ -75,6 +227,7 @@ def get_config():
 def update_config(new_config: dict):
     with open("config.json", "w") as f:
         json.dump(new_config, f, indent=2)
+    engine.set_config(load_config())
     return {"status": "Config updated"}
 
 @app.post("/open-folder")
@@ -19,15 +19,27 @@ datas = [
     ('../config.json', '.'),
     ('./parsers', 'backend/parsers'),
     ('./__init__.py', 'backend'),
+    ('./ann.py', 'backend'),
     ('./api.py', 'backend'),
     ('./config.py', 'backend'),
+    ('./dedup.py', 'backend'),
+    ('./engine.py', 'backend'),
     ('./search.py', 'backend'),
+    ('./shards.py', 'backend'),
     ('./chunker.py', 'backend'),
     ('./embedder.py', 'backend'),
+    ('./embedding_cache.py', 'backend'),
     ('./file_loader.py', 'backend'),
     ('./indexer.py', 'backend'),
+    ('./inverted_index.py', 'backend'),
+    ('./jobs.py', 'backend'),
     ('./logger.py', 'backend'),
     ('./main.py', 'backend'),
+    ('./manifest.py', 'backend'),
+    ('./metadata.py', 'backend'),
+    ('./metrics.py', 'backend'),
+    ('./quantization.py', 'backend'),
+    ('./result_cache.py', 'backend'),
     ('./storage.py', 'backend'),
     *collect_data_files('fastapi'),
     *collect_data_files('uvicorn'),
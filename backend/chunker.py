@@ -1,38 +1,156 @@
 import re
-def chunk_documents(documents, config):
-    chunk_size = config.get("chunk_size", 200)  # Smaller chunks
-    chunk_overlap = config.get("chunk_overlap", 50)
-    all_chunks = []
-
-    for doc in documents:
-        text = doc['text']
-        # Split into sentences for finer granularity
-        sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-        current_chunk = ""
-        chunk_id = 0
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
+from bisect import bisect_right
+
+from backend.logger import get_logger
+
+logger = get_logger()
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+# Sentences per tokenizer call when sizing chunks in tokens.
+TOKENIZE_BATCH_SIZE = 1024
+# Room for the [CLS]/[SEP] (or <s>/</s>) tokens the model adds around each chunk.
+SPECIAL_TOKENS = 2
+# Streamed sections are joined into blocks of about this many characters and each
+# block is chunked on its own, so a huge file is never held as one string.
+BLOCK_CHARS = 1 << 20
+
+
+def sentence_bounds(text):
+    """Character offsets where each sentence ends (the start of the next one), ending with len(text)."""
+    bounds = [m.end() for m in SENTENCE_END_RE.finditer(text)]
+    if not bounds or bounds[-1] != len(text):
+        bounds.append(len(text))
+    return bounds
+
+
+def _pack(bounds, size, overlap, is_word_start):
+    """Yield (start, end) unit ranges of chunks of at most `size` units.
+
+    Chunks end on a sentence boundary from `bounds` when one fits past the previous
+    chunk's end, otherwise they are cut at `size` (moved back to a word start). Each chunk after the first
+    starts up to `overlap` units before the previous one ended, at a word start.
+    """
+    total = bounds[-1] if bounds else 0
+    start = previous_end = 0
+    while start < total:
+        i = bisect_right(bounds, start + size) - 1
+        # A boundary at or before the previous chunk's end would give a chunk of overlap only.
+        if i >= 0 and bounds[i] > max(start, previous_end):
+            end = bounds[i]
+        else:
+            # One sentence longer than a chunk: split it, but not inside a word.
+            end = min(start + size, total)
+            cut = end
+            while cut > start + 1 and cut < total and not is_word_start(cut):
+                cut -= 1
+            if cut > start + 1:
+                end = cut
+        yield start, end
+        if end >= total:
+            return
+        previous_end = end
+        start = max(end - overlap, start + 1)
+        while start < end and not is_word_start(start):
+            start += 1
+
+
+def _char_chunks(text, size, overlap):
+    def is_word_start(i):
+        return not text[i].isspace() and text[i - 1].isspace()
+
+    return _pack(sentence_bounds(text), size, overlap, is_word_start)
+
+
+def _token_offsets(text, bounds, tokenizer):
+    """(start, end) character offsets of every token, tokenizing sentence by sentence in batches."""
+    starts, ends, sentence_ends = [], [], []
+    spans = list(zip([0] + bounds[:-1], bounds))
+    for i in range(0, len(spans), TOKENIZE_BATCH_SIZE):
+        batch = spans[i:i + TOKENIZE_BATCH_SIZE]
+        encoded = tokenizer([text[a:b] for a, b in batch], add_special_tokens=False, truncation=False,
+                            return_offsets_mapping=True, return_attention_mask=False)
+        for (a, _), offsets in zip(batch, encoded["offset_mapping"]):
+            for s, e in offsets:
+                starts.append(a + s)
+                ends.append(a + e)
+            sentence_ends.append(len(starts))
+    return starts, ends, sentence_ends
+
+
+def _token_chunks(text, size, overlap, tokenizer):
+    starts, ends, bounds = _token_offsets(text, sentence_bounds(text), tokenizer)
+
+    def is_word_start(i):
+        # No gap between this token and the previous one means it continues a word.
+        return starts[i] > ends[i - 1]
+
+    for start, end in _pack(bounds, size, overlap, is_word_start):
+        yield starts[start], ends[end - 1]
+
+
+def chunk_size_limit(config, tokenizer=None, max_seq_length=None):
+    """Effective chunk size: in tokens, never more than the model reads in one pass."""
+    size = config.get("chunk_size", 200)
+    if tokenizer is not None and max_seq_length:
+        size = min(size, max_seq_length - SPECIAL_TOKENS)
+    return size
+
+
+def iter_blocks(sections):
+    """Join (page, text) sections with newlines into (text, section starts, pages) blocks of about BLOCK_CHARS."""
+    parts, starts, pages, length = [], [], [], 0
+    for page, text in sections:
+        if not text:
+            continue
+        if parts:
+            length += 1
+        parts.append(text)
+        starts.append(length)
+        pages.append(page)
+        length += len(text)
+        if length >= BLOCK_CHARS:
+            yield "\n".join(parts), starts, pages
+            parts, starts, pages, length = [], [], [], 0
+    if parts:
+        yield "\n".join(parts), starts, pages
+
+
+def iter_chunks(doc, config, tokenizer=None, max_seq_length=None):
+    """Yield the chunks of one document, in order.
+
+    The document's text comes from doc['sections'], (page, text) pairs that may be
+    a lazy stream, or from doc['text']. Each chunk records the page it starts on
+    (None when the source has no pages). Sizes are in characters, or in model
+    tokens when a (fast, offset-reporting) `tokenizer` is given.
+    """
+    sections = doc['sections'] if 'sections' in doc else [(None, doc['text'])]
+    size = chunk_size_limit(config, tokenizer, max_seq_length)
+    overlap = min(config.get("chunk_overlap", 50), size - 1)
+    chunk_id = 0
+    for text, starts, pages in iter_blocks(sections):
+        spans = _token_chunks(text, size, overlap, tokenizer) if tokenizer is not None else _char_chunks(text, size, overlap)
+        for start, end in spans:
+            chunk = text[start:end]
+            stripped = chunk.lstrip()
+            first = start + len(chunk) - len(stripped)
+            chunk = stripped.rstrip()
+            if not chunk:
                 continue
-            if len(current_chunk) + len(sentence) <= chunk_size:
-                current_chunk += " " + sentence
-            else:
-                if current_chunk:
-                    all_chunks.append({
-                        "filename": doc["filename"],
-                        "chunk_id": chunk_id,
-                        "text": current_chunk.strip()
-                    })
-                    chunk_id += 1
-                    # Add overlap
-                    overlap_text = current_chunk[-chunk_overlap:] if len(current_chunk) > chunk_overlap else current_chunk
-                    current_chunk = overlap_text + " " + sentence
-                else:
-                    current_chunk = sentence
-        if current_chunk:
-            all_chunks.append({
+            yield {
                 "filename": doc["filename"],
                 "chunk_id": chunk_id,
-                "text": current_chunk.strip()
-            })
-    return all_chunks
\ No newline at end of file
+                "text": chunk,
+                "page": pages[bisect_right(starts, first) - 1]
+            }
+            chunk_id += 1
+
+
+def chunk_tokenizer(config, model):
+    """(tokenizer, max_seq_length) for chunk_unit="tokens", or (None, None) to size in characters."""
+    if config.get("chunk_unit", "chars") != "tokens":
+        return None, None
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        logger.warning("Embedding model has no fast tokenizer; sizing chunks in characters")
+        return None, None
+    return tokenizer, getattr(model, "max_seq_length", None)
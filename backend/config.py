@@ -1,5 +1,7 @@
 from pydantic import BaseModel, ValidationError
 import json
+import os
+from typing import Literal
 
 class ConfigModel(BaseModel):
     source_folder: str
@@ -7,10 +9,55 @@ class ConfigModel(BaseModel):
     supported_extensions: list
     chunk_size: int
     chunk_overlap: int
+    chunk_unit: Literal["chars", "tokens"] = "chars"  # what chunk_size/chunk_overlap count; tokens use the model's tokenizer
     embedding_model: str
     min_score: float
+    vector_dtype: Literal["float32", "float16"] = "float32"
+    use_faiss: bool = False  # legacy switch, same as ann_index="flat"
+    ann_index: Literal["none", "flat", "hnsw", "ivfpq"] = "none"
+    ann_candidates: int = 100
+    ann_nlist: int = 1024
+    ann_nprobe: int = 16
+    ann_pq_m: int = 48
+    ann_hnsw_m: int = 32
+    ann_ef_construction: int = 200
+    ann_ef_search: int = 64
+    index_workers: int = 0  # parser processes; 0 = one per CPU core, 1 = parse in-process
+    stream_threshold_mb: float = 16  # PDF/JSON/HTML/DOCX files this large are parsed page by page in-process instead of whole
+    embed_batch_size: int = 256  # chunks embedded and appended per step while indexing
+    ocr_workers: int = 4  # concurrent tesseract calls when indexing images
+    caption_batch_size: int = 8  # images per BLIP generate call
+    embedding_cache: bool = True  # reuse stored embeddings of previously seen chunk texts
+    query_cache_size: int = 1024  # query embeddings kept in memory by the API
+    result_cache_size: int = 256  # ranked /search results kept per index version; 0 disables
+    result_cache_ttl: float = 300  # seconds a cached /search result is served
+    result_cache_depth: int = 50  # hits ranked per cached query, served as offset/limit pages
+    dedup_files: bool = True  # byte-identical files are parsed, embedded and stored once
+    collapse_duplicates: bool = True  # fold near-duplicate chunks in results into the best one
+    near_duplicate_distance: int = 8  # max differing SimHash bits (of 64); a one-word edit of a 500-char chunk is typically 5
+    serve_workers: int = 1  # API worker processes (backend.main); they share the memory-mapped index
+    search_shards: int = 0  # processes per API worker that split vector scoring by file; 0 = score in-process
+    compact_threshold: float = 0.3  # rewrite the index once this fraction of rows is tombstoned
+    fusion: Literal["none", "rrf", "weighted"] = "rrf"  # combine vector and BM25 hits; "none" = flat keyword boost
+    rrf_k: int = 60  # reciprocal rank fusion damping constant
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+    vector_candidates: int = 50  # hits taken from each retriever before fusion
+    lexical_candidates: int = 50
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    vector_quantization: Literal["none", "int8", "binary"] = "none"  # compressed codes scored before exact rescoring
+    rescore_candidates: int = 200  # rows rescored at full precision after a quantized first pass
+    debug_logging: bool = False  # log every parsed file and search stage (slow on large corpora)
 
 def load_config(path="config.json"):
     with open(path) as f:
         data = json.load(f)
     return ConfigModel(**data).dict()
+
+def config_mtime(path="config.json"):
+    """mtime of the config file, used by API workers to notice a config saved by another worker."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,138 @@
+"""Duplicate detection: whole files by content hash, chunks by SimHash.
+
+Byte-identical files are stored once. The first copy is parsed and embedded; the
+others get a manifest entry with `duplicate_of` and no rows, and search results
+from the stored copy list them as extra locations.
+
+Every chunk also gets a 64-bit SimHash of its word 3-shingles, kept next to the
+segment (`<segment>.simhash`) and extended on append like the other side files.
+Chunks whose signatures differ in at most near_duplicate_distance bits are
+near-duplicates (boilerplate pages, lightly edited copies of a document), and
+search() collapses them into the best-scoring one.
+"""
+import os
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from backend.inverted_index import tokenize
+from backend.logger import get_logger
+
+logger = get_logger()
+
+SIGNATURE_BITS = 64
+SHINGLE_SIZE = 3
+SIGNATURE_BATCH_SIZE = 10000
+_SHIFTS = np.arange(SIGNATURE_BITS, dtype=np.uint64)
+# Odd multipliers to combine a shingle's token hashes, and a 64-bit finalizer (splitmix64).
+_SHINGLE_MULTIPLIERS = [np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9)]
+_MIX = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+
+def signatures_path(folder, segment):
+    return Path(folder) / f"{segment}.simhash"
+
+
+def _token_hashes(tokens):
+    return np.array([zlib.crc32(t.encode("utf-8")) | (zlib.crc32(t.encode("utf-8"), 0x5BD1E995) << 32)
+                     for t in tokens], dtype=np.uint64)
+
+
+def simhash(text):
+    """64-bit SimHash of the text's word 3-shingles (of its words, if it has fewer than three)."""
+    hashes = _token_hashes(tokenize(text))
+    if len(hashes) >= SHINGLE_SIZE:
+        count = len(hashes) - SHINGLE_SIZE + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for i in range(SHINGLE_SIZE):
+            shingles ^= hashes[i:i + count] * _SHINGLE_MULTIPLIERS[i]
+        hashes = shingles
+    if not len(hashes):
+        return 0
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * _MIX[0]
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * _MIX[1]
+    hashes ^= hashes >> np.uint64(31)
+    ones = ((hashes[:, None] >> _SHIFTS) & np.uint64(1)).sum(axis=0)
+    bits = (2 * ones > len(hashes)).astype(np.uint64)
+    return int((bits << _SHIFTS).sum())
+
+
+def hamming(a, b):
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def build_signatures(store):
+    """Write (or extend) the SimHash of every row of `store`; returns the index.json entry."""
+    if len(store) == 0:
+        return None
+    path = signatures_path(store.folder, store.info["segment"])
+    previous = store.info.get("simhash")
+    if previous and previous["rows"] <= len(store) and path.exists():
+        start = previous["rows"]
+        target = open(path, "r+b")
+        target.truncate(start * 8)
+        target.seek(start * 8)
+    else:
+        start = 0
+        target = open(path, "wb")
+    logger.info(f"Computing near-duplicate signatures for {len(store) - start} chunks")
+    with target:
+        for i in range(start, len(store), SIGNATURE_BATCH_SIZE):
+            end = min(i + SIGNATURE_BATCH_SIZE, len(store))
+            target.write(np.array([simhash(store.text(row)) for row in range(i, end)], dtype="<u8").tobytes())
+        target.flush()
+        os.fsync(target.fileno())
+    return {"rows": len(store)}
+
+
+def load_signatures(store):
+    """Memory-mapped signatures for `store` when they cover every row, else None."""
+    info = store.info.get("simhash")
+    if not info or info["rows"] != len(store) or len(store) == 0:
+        return None
+    return np.memmap(signatures_path(store.folder, store.info["segment"]), dtype="<u8", mode="r", shape=(len(store),))
+
+
+def collapse(hits, signatures, max_distance):
+    """Fold each hit into the first (best) earlier hit within `max_distance` SimHash bits.
+
+    Returns (kept hits, {kept row: [folded rows]}).
+    """
+    kept, folded, kept_signatures = [], {}, []
+    for row, score in hits:
+        signature = int(signatures[row])
+        for (kept_row, _), kept_signature in zip(kept, kept_signatures):
+            if hamming(signature, kept_signature) <= max_distance:
+                folded[kept_row].append(row)
+                break
+        else:
+            kept.append((row, score))
+            kept_signatures.append(signature)
+            folded[row] = []
+    return kept, folded
+
+
+def assign_duplicates(changed, indexed, pending_paths):
+    """Split changed files into ones to parse and byte-identical copies of another file.
+
+    `changed` maps path -> manifest metadata (with "hash"); `indexed` is the current
+    index's live files. A changed file is a copy if an indexed file that is staying
+    (not in `pending_paths`) and holds content has the same hash, or if another changed
+    file with that hash sorts before it. Returns ({path: meta} to parse,
+    {path: canonical path} of copies).
+    """
+    canonical = {}
+    for path, entry in indexed.items():
+        if path not in pending_paths and entry.get("hash") and not entry.get("duplicate_of"):
+            canonical.setdefault(entry["hash"], path)
+    to_parse, copies = {}, {}
+    for path in sorted(changed):
+        content = changed[path].get("hash")
+        if content is not None and content in canonical:
+            copies[path] = canonical[content]
+        else:
+            if content is not None:
+                canonical[content] = path
+            to_parse[path] = changed[path]
+    return to_parse, copies
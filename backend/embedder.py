@@ -1,25 +1,118 @@
 import os
-from sentence_transformers import SentenceTransformer
+import threading
 import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.embedding_cache import text_hash
+from backend import metrics
 
 logger = logging.getLogger(__name__)
 
-def embed_documents(chunks, config):
+_models = {}
+_models_lock = threading.Lock()
+_query_cache = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+def load_model(config):
+    # Imported here so that importing the backend doesn't pay for torch.
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1'))
+
+def get_model(config):
+    """Process-wide model for config['embedding_model'], loaded on first use."""
+    name = config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1')
+    with _models_lock:
+        if name not in _models:
+            _models[name] = load_model(config)
+        return _models[name]
+
+def set_model(config, model):
+    """Use `model` (anything with SentenceTransformer's encode()) for config['embedding_model'].
+
+    Lets benchmarks run the real indexing and search paths with an offline embedder.
+    """
+    with _models_lock:
+        _models[config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1')] = model
+
+def encode_query(query, config):
+    """Embedding for a search query, memoized in a small in-process LRU.
+
+    Returned arrays are shared between callers and marked read-only.
+    """
+    key = (config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1'), query)
+    with _query_cache_lock:
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+            metrics.QUERY_CACHE.inc(result="hit")
+            return _query_cache[key]
+    metrics.QUERY_CACHE.inc(result="miss")
+    with metrics.span("query_encode"):
+        embedding = get_model(config).encode(query)
+    embedding.setflags(write=False)
+    with _query_cache_lock:
+        _query_cache[key] = embedding
+        while len(_query_cache) > config.get('query_cache_size', 1024):
+            _query_cache.popitem(last=False)
+    return embedding
+
+def encode_queries(queries, config):
+    """Embeddings for many queries as one (n, dim) array, from a single model.encode call.
+
+    Shares encode_query's LRU: cached queries are not re-encoded and new ones are added.
+    """
+    name = config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1')
+    found = {}
+    with _query_cache_lock:
+        for query in queries:
+            key = (name, query)
+            if key in _query_cache:
+                _query_cache.move_to_end(key)
+                found[query] = _query_cache[key]
+    missing = list(dict.fromkeys(query for query in queries if query not in found))
+    metrics.QUERY_CACHE.inc(len(queries) - len(missing), result="hit")
+    metrics.QUERY_CACHE.inc(len(missing), result="miss")
+    if missing:
+        with metrics.span("query_encode"):
+            embeddings = get_model(config).encode(missing, batch_size=config.get('batch_size', 32),
+                                                  convert_to_tensor=False, show_progress_bar=False)
+        with _query_cache_lock:
+            for query, embedding in zip(missing, embeddings):
+                embedding = embedding.copy()
+                embedding.setflags(write=False)
+                found[query] = _query_cache[(name, query)] = embedding
+            while len(_query_cache) > config.get('query_cache_size', 1024):
+                _query_cache.popitem(last=False)
+    return np.stack([found[query] for query in queries])
+
+def embed_documents(chunks, config, model=None, cache=None):
+    """Embed chunk texts; with an EmbeddingCache only unseen texts reach the model."""
     try:
-        model = SentenceTransformer(config.get('embedding_model', 'multi-qa-MiniLM-L6-cos-v1'))
+        if model is None:
+            model = get_model(config)
         batch_size = config.get('batch_size', 32)  # Process in batches
-        texts = [chunk['text'] for chunk in chunks]
-        embeddings = []
+        hashes = [text_hash(chunk['text']) for chunk in chunks]
+        known = cache.get_many(set(hashes)) if cache is not None else {}
+        # Identical texts (boilerplate, overlap) are encoded once.
+        missing = {h: chunk['text'] for h, chunk in zip(hashes, chunks) if h not in known}
+        missing_hashes, texts = list(missing), list(missing.values())
+        computed = {}
         for i in range(0, len(texts), batch_size):
             batch_texts = texts[i:i + batch_size]
             batch_embeddings = model.encode(batch_texts, convert_to_tensor=False, show_progress_bar=False)
-            embeddings.extend(batch_embeddings)
+            computed.update(zip(missing_hashes[i:i + batch_size], batch_embeddings))
+        if cache is not None and computed:
+            cache.put_many(computed)
+        known.update(computed)
+        embeddings = [known[h] for h in hashes]
         return [
             {
                 'filename': os.path.abspath(chunk['filename']),
                 'chunk_id': chunk['chunk_id'],
+                'page': chunk.get('page'),
                 'text': chunk['text'],
-                'embedding': emb.tolist()
+                'embedding': emb
             }
             for chunk, emb in zip(chunks, embeddings)
         ]
@@ -0,0 +1,57 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+CACHE_FILE = "embedding_cache.sqlite"
+# SQLite's default limit on bound parameters is 999 in older builds.
+LOOKUP_BATCH = 900
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Content-addressed store of raw model outputs, keyed by (model name, sha1(text)).
+
+    Lives under index_folder so repeated reindexes (and full rebuilds) of mostly
+    unchanged corpora only run the model on text it hasn't seen.
+    """
+
+    def __init__(self, config):
+        folder = Path(config["index_folder"])
+        folder.mkdir(parents=True, exist_ok=True)
+        self.model = config.get("embedding_model", "multi-qa-MiniLM-L6-cos-v1")
+        self.conn = sqlite3.connect(folder / CACHE_FILE)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+
+    def get_many(self, hashes):
+        """Cached vectors for the given hashes, as {hash: np.ndarray}."""
+        found = {}
+        hashes = list(hashes)
+        for i in range(0, len(hashes), LOOKUP_BATCH):
+            batch = hashes[i:i + LOOKUP_BATCH]
+            rows = self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                [self.model, *batch],
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        """Store {hash: vector} pairs."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(self.model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+            )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,215 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import config_mtime, load_config
+from backend.logger import get_logger
+from backend import metrics
+from backend.ann import load_ann_index
+from backend.embedder import encode_query
+from backend.inverted_index import LexicalIndex, PathIndex, load_lexical_index
+from backend.metadata import FileMetadata, active_filters
+from backend.quantization import QuantizedVectors, load_quantized
+from backend.result_cache import ResultCache, filters_key, normalize_query
+from backend.search import NO_MATCH, inverse_norms, rank_depth, search, search_batch
+from backend.shards import ShardPool
+from backend.storage import StoredIndex, index_mtime, load_index
+
+logger = get_logger()
+
+
+@dataclass(frozen=True)
+class EngineState:
+    """Everything a query needs, loaded once per published index version."""
+    store: Optional[StoredIndex]
+    ann_index: Any
+    inv_norms: Optional[np.ndarray]
+    lexicon: Optional[LexicalIndex]
+    path_index: Optional[PathIndex]
+    metadata: Optional[FileMetadata]
+    quantized: Optional[QuantizedVectors]
+    mtime: Optional[int]
+
+
+class SearchEngine:
+    """Long-lived holder of the loaded index.
+
+    Queries read `self._state` once and use that snapshot throughout, so a reload
+    (after /reindex, a config change, or index.json changing on disk) builds the
+    new state off to the side and swaps it in with a single assignment. A
+    config.json saved through another API worker is picked up the same way.
+
+    `results` caches ranked results of search_page() per index version; loading a
+    new index or config empties it.
+
+    With search_shards > 0, vector scoring of unfiltered queries is spread over that
+    many shard processes (see backend.shards) and only their merged top-k comes back
+    here for fusion and result assembly.
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self._config_mtime = config_mtime()
+        self._config_lock = threading.Lock()
+        self.results = self._result_cache(config)
+        self.shards = self._shard_pool(config)
+        self._reload_lock = threading.Lock()
+        self._state = EngineState(store=None, ann_index=None, inv_norms=None, lexicon=None,
+                                  path_index=None, metadata=None, quantized=None,
+                                  mtime=None)
+        self.reload()
+
+    @staticmethod
+    def _shard_pool(config: Dict) -> Optional[ShardPool]:
+        count = config.get("search_shards", 0)
+        return ShardPool(config, count) if count > 0 else None
+
+    @staticmethod
+    def _result_cache(config: Dict) -> ResultCache:
+        return ResultCache(config.get("result_cache_size", 256), config.get("result_cache_ttl", 300.0))
+
+    def _load_state(self) -> EngineState:
+        with metrics.span("index_load"):
+            state = self._build_state()
+        self.results.clear()
+        return state
+
+    def _build_state(self) -> EngineState:
+        mtime = index_mtime(self.config)
+        store = load_index(self.config)
+        # Migration of a legacy embeddings.json publishes index.json; pick up its mtime.
+        if store is not None and mtime is None:
+            mtime = index_mtime(self.config)
+        inv_norms = inverse_norms(store) if store is not None else None
+        ann_index = load_ann_index(store, self.config)
+        lexicon = load_lexical_index(store)
+        path_index = PathIndex(store.files, self.config["source_folder"]) if store is not None else None
+        metadata = FileMetadata(store, self.config["source_folder"]) if store is not None else None
+        quantized = load_quantized(store, self.config)
+        return EngineState(store=store, ann_index=ann_index, inv_norms=inv_norms, lexicon=lexicon,
+                           path_index=path_index, metadata=metadata, quantized=quantized, mtime=mtime)
+
+    def reload(self):
+        with self._reload_lock:
+            state = self._load_state()
+            self._state = state
+        if state.store is not None:
+            logger.info(f"Search index v{state.store.version} loaded ({len(state.store)} chunks)")
+        return state
+
+    def set_config(self, config: Dict):
+        self._config_mtime = config_mtime()
+        self.config = config
+        self.results = self._result_cache(config)
+        # Shard processes hold their own copy of the config; start fresh ones.
+        self.close()
+        self.shards = self._shard_pool(config)
+        self.reload()
+
+    def close(self):
+        if self.shards is not None:
+            self.shards.close()
+            self.shards = None
+
+    def _check_config(self):
+        """Apply config.json if it changed since it was last loaded (saved through another API worker)."""
+        mtime = config_mtime()
+        if mtime is None or mtime == self._config_mtime:
+            return
+        with self._config_lock:
+            if config_mtime() == self._config_mtime:
+                return
+            try:
+                config = load_config()
+            except Exception as e:
+                # Possibly caught mid-write; the next query tries again.
+                logger.warning(f"Could not reload config.json: {e}")
+                return
+            logger.info("config.json changed; reloading search settings")
+            self.set_config(config)
+            # The version just loaded; a save that raced with loading it is picked up next time.
+            self._config_mtime = mtime
+
+    def current(self) -> EngineState:
+        """Return the live state, reloading first if config.json or index.json changed on disk."""
+        self._check_config()
+        state = self._state
+        if index_mtime(self.config) != state.mtime:
+            with self._reload_lock:
+                if index_mtime(self.config) != self._state.mtime:
+                    self._state = self._load_state()
+                state = self._state
+        return state
+
+    @property
+    def ready(self) -> bool:
+        return self.current().store is not None
+
+    def _shard_hits(self, state: EngineState, query_embedding: np.ndarray, top_k: int,
+                    filters: Optional[Dict]) -> Optional[List]:
+        """Vector candidates gathered from the shard processes, or None to score in this process.
+
+        Filtered queries are scored here: their scope is usually narrow, and search()
+        resolves filters against this process's metadata.
+        """
+        shards = self.shards
+        if shards is None or state.store is None or active_filters(filters):
+            return None
+        with metrics.span("shard_score"):
+            return shards.top_k(state.store.version, query_embedding,
+                                max(rank_depth(state.store, top_k, self.config),
+                                    self.config.get("vector_candidates", 50)))
+
+    def search(self, query_embedding: np.ndarray, query: str = "", top_k: int = 5,
+               filters: Optional[Dict] = None) -> Dict:
+        state = self.current()
+        return search(query_embedding, self.config, query=query, top_k=top_k,
+                      store=state.store, ann_index=state.ann_index, inv_norms=state.inv_norms,
+                      lexicon=state.lexicon, path_index=state.path_index, filters=filters,
+                      metadata=state.metadata, quantized=state.quantized,
+                      vector_hits=self._shard_hits(state, query_embedding, top_k, filters))
+
+    def search_batch(self, query_embeddings: np.ndarray, queries: List[Dict]) -> List[Dict]:
+        state = self.current()
+        return search_batch(query_embeddings, self.config, queries, store=state.store, ann_index=state.ann_index,
+                            inv_norms=state.inv_norms, lexicon=state.lexicon, path_index=state.path_index,
+                            metadata=state.metadata, quantized=state.quantized)
+
+    def search_page(self, query: str, offset: int = 0, limit: int = 5, filters: Optional[Dict] = None) -> Dict:
+        """Results [offset, offset + limit) of `query`, ranked once and then served from `results`.
+
+        The first request for a (normalized query, filters, index version) ranks
+        result_cache_depth hits (more if the page reaches past them); later pages
+        and repeats of the query skip encoding and scoring entirely.
+        """
+        query = normalize_query(query)
+        state = self.current()
+        key = (state.store.version if state.store is not None else None, state.mtime, query, filters_key(filters))
+        end = offset + limit
+        entry = self.results.get(key)
+        if entry is not None and (entry["complete"] or len(entry["hits"]) >= end):
+            metrics.RESULT_CACHE.inc(result="hit")
+        else:
+            metrics.RESULT_CACHE.inc(result="miss")
+            depth = max(end, self.config.get("result_cache_depth", 50))
+            query_embedding = encode_query(query, self.config)
+            result = search(query_embedding, self.config, query=query, top_k=depth,
+                            store=state.store, ann_index=state.ann_index, inv_norms=state.inv_norms,
+                            lexicon=state.lexicon, path_index=state.path_index, filters=filters,
+                            metadata=state.metadata, quantized=state.quantized,
+                            vector_hits=self._shard_hits(state, query_embedding, depth, filters))
+            hits = [hit for hit in result["embedMatch"] if hit["filename"]]
+            if not hits and result["embedMatch"][0]["text"] != NO_MATCH["text"]:
+                return result  # no index or a search error; not cached
+            entry = {"fileMatch": result["fileMatch"], "hits": hits, "complete": len(hits) < depth}
+            self.results.put(key, entry)
+        page = entry["hits"][offset:end]
+        return {
+            "fileMatch": entry["fileMatch"],
+            "embedMatch": page or ([dict(NO_MATCH)] if offset == 0 else []),
+            "offset": offset,
+            "limit": limit,
+            "hasMore": len(entry["hits"]) > end or not entry["complete"],
+        }
@@ -1,39 +1,157 @@
 from pathlib import Path
-from backend.parsers import get_parser
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from backend.parsers import get_parser, iter_sections
+from backend.logger import get_logger, set_debug
+from backend import metrics
 import os
+import time
 from datetime import datetime
 
-def load_files(config):
+logger = get_logger()
+
+def _document(file_path, folder, sections):
+    """Document dict for a file; `sections` are its (page, text) pieces, a list or a lazy stream."""
+    if isinstance(sections, list) and not any(text.strip() for _, text in sections):
+        logger.debug(f"Skipped (empty text): {file_path}")
+        return None
+    relative_path = str(file_path.relative_to(folder))
+    logger.debug(f"Parsed: {file_path}")
+    stat = file_path.stat()
+    return {
+        'filename': str(file_path.resolve()),
+        'relative_path': relative_path,
+        'sections': sections,
+        'size_bytes': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        'type': file_path.suffix.lower().lstrip(".")
+    }
+
+def parse_file(file_path, folder):
+    """Parse one file into a document dict, or None if it has no text or fails.
+
+    Module-level so it can run in a worker process.
+    """
+    ext = file_path.suffix.lower()
+    parser = get_parser(ext)
+    if not parser:
+        logger.debug(f"No parser for {ext}")
+        return None
+    try:
+        logger.debug(f"Parsing {file_path}")
+        return _document(file_path, folder, list(iter_sections(parser, file_path)))
+    except Exception as e:
+        logger.warning(f"Error reading {file_path}: {e}")
+    return None
+
+def _streamed_sections(file_path, parser):
+    """The parser's sections for `file_path`, read as they are consumed.
+
+    A parse error ends the stream (what was read so far is kept), and the time
+    spent reading is reported as one "parse" observation at the end.
+    """
+    seconds = 0.0
+    start = time.perf_counter()
+    try:
+        for section in iter_sections(parser, file_path):
+            seconds += time.perf_counter() - start
+            yield section
+            start = time.perf_counter()
+        seconds += time.perf_counter() - start
+    except Exception as e:
+        logger.warning(f"Error reading {file_path}: {e}")
+    metrics.observe("parse", seconds)
+
+def _iter_streamed(config, paths):
+    """Documents for large files, parsed lazily in this process as chunking consumes them."""
+    folder = Path(config['source_folder'])
+    for file_path in paths:
+        parser = get_parser(file_path.suffix.lower())
+        logger.debug(f"Streaming {file_path}")
+        try:
+            yield file_path, _document(file_path, folder, _streamed_sections(file_path, parser))
+        except Exception as e:
+            logger.warning(f"Error reading {file_path}: {e}")
+            yield file_path, None
+
+def _timed_parse(file_path, folder):
+    """parse_file plus its duration, so pool workers can report parse time to the parent."""
+    start = time.perf_counter()
+    doc = parse_file(file_path, folder)
+    return doc, time.perf_counter() - start
+
+def _iter_batch_parsed(config, parser, paths):
+    """Run a parser's parse_batch() (e.g. images) in this process."""
     folder = Path(config['source_folder'])
-    extensions = config['supported_extensions']
-    documents = []
-
-    for file_path in folder.rglob('*'):
-        ext = file_path.suffix.lower()
-        if ext in extensions:
-            parser = get_parser(ext)
-            if not parser:
-                print(f"No parser for {ext}")
-                continue
-            try:
-                print(f"Indexing {file_path}")
-                text = parser.parse(file_path)
-                if text.strip():
-                    relative_path = str(file_path.relative_to(folder))
-                    print(f"Indexed: {file_path}")
-                    stat = file_path.stat()
-                    documents.append({
-                        'filename': str(file_path.resolve()),
-                        'relative_path': relative_path, 
-                        'text': f"{relative_path}\n\n{text}",
-                        'text': text,
-                        'size_bytes': stat.st_size,
-                        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'type': file_path.suffix.lower().lstrip(".")
-                    })
-                else:
-                    print(f"Skipped (empty text): {file_path}")
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
-
-    return documents
\ No newline at end of file
+    start = time.perf_counter()
+    for file_path, text in parser.parse_batch(paths, ocr_workers=config.get('ocr_workers', 4),
+                                              caption_batch_size=config.get('caption_batch_size', 8)):
+        # Batches overlap files; attribute the time since the previous result to this one.
+        metrics.observe("parse", time.perf_counter() - start)
+        try:
+            yield file_path, _document(file_path, folder, [(None, text)])
+        except Exception as e:
+            logger.warning(f"Error reading {file_path}: {e}")
+            yield file_path, None
+        start = time.perf_counter()
+
+def iter_parsed_files(config, paths):
+    """Yield (path, document or None) for `paths`, parsing in a bounded process pool.
+
+    At most 2 * index_workers files are in flight, so a slow consumer (embedding)
+    holds back parsing instead of letting parsed text pile up. Results arrive in
+    completion order. index_workers=1 parses in-process.
+
+    Files whose parser offers parse_batch() (images: batched captioning, concurrent
+    OCR) are set aside and parsed together in this process after the others.
+    Files of stream_threshold_mb or more whose parser can read incrementally are
+    set aside too; their documents carry a lazy 'sections' stream instead of the
+    whole text, so memory use is bounded by a page or record rather than the file.
+    """
+    folder = Path(config['source_folder'])
+    workers = config.get('index_workers') or os.cpu_count() or 1
+    stream_bytes = config.get('stream_threshold_mb', 16) * 2**20
+    batched = {}
+    streamed = []
+
+    def per_file_paths():
+        for file_path in paths:
+            parser = get_parser(file_path.suffix.lower())
+            if parser is not None and hasattr(parser, 'parse_batch'):
+                batched.setdefault(parser, []).append(file_path)
+            elif parser is not None and hasattr(parser, 'iter_sections') and _file_size(file_path) >= stream_bytes:
+                streamed.append(file_path)
+            else:
+                yield file_path
+
+    if workers == 1:
+        for file_path in per_file_paths():
+            with metrics.span("parse"):
+                doc = parse_file(file_path, folder)
+            yield file_path, doc
+    else:
+        remaining = per_file_paths()
+        with ProcessPoolExecutor(max_workers=workers, initializer=set_debug,
+                                 initargs=(config.get('debug_logging', False),)) as executor:
+            pending = {}
+            while True:
+                for file_path in remaining:
+                    pending[executor.submit(_timed_parse, file_path, folder)] = file_path
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    doc, seconds = future.result()
+                    metrics.observe("parse", seconds)
+                    yield pending.pop(future), doc
+
+    for parser, parser_paths in batched.items():
+        yield from _iter_batch_parsed(config, parser, parser_paths)
+    yield from _iter_streamed(config, streamed)
+
+def _file_size(file_path):
+    try:
+        return file_path.stat().st_size
+    except OSError:
+        return 0
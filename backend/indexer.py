@@ -1,22 +1,179 @@
 from backend.config import load_config
-from backend.file_loader import load_files
-from backend.chunker import chunk_documents
-from backend.embedder import embed_documents
-from backend.storage import save_index
-from backend.logger import get_logger
+from backend.file_loader import iter_parsed_files
+from backend.chunker import chunk_tokenizer, iter_chunks
+from backend.embedder import embed_documents, get_model
+from backend.embedding_cache import EmbeddingCache
+from backend.storage import IndexWriter, can_append, compact_index, load_index, writer_lock
+from backend.manifest import plan_changes, scan_source_files
+from backend.ann import build_ann_index
+from backend.inverted_index import remove_unused_parts, update_lexical_index
+from backend.quantization import build_quantized
+from backend.dedup import assign_duplicates, build_signatures
+from backend.logger import get_logger, set_debug
+from backend import metrics
 logger = get_logger()
 
-def run_indexing():
+class _EmbedBuffer:
+    """Collects chunked documents and embeds/stores them once enough chunks are queued.
+
+    Files are stored one after another, so each file's rows stay contiguous even
+    when a long (streamed) file is flushed over several batches.
+    """
+
+    def __init__(self, writer, config, model, cache=None):
+        self.writer = writer
+        self.config = config
+        self.model = model
+        self.cache = cache
+        self.batch_size = config.get("embed_batch_size", 256)
+        self.pending = []
+        self.pending_chunks = 0
+        self.chunks = 0
+        self._described = None
+
+    def add(self, path, meta, chunks):
+        """Queue a file's chunks; `chunks` may be a lazy iterable and is consumed here."""
+        doc_chunks = []
+        self.pending.append((path, meta, doc_chunks))
+        for chunk in chunks:
+            doc_chunks.append(chunk)
+            self.pending_chunks += 1
+            if self.pending_chunks >= self.batch_size:
+                self.flush()
+                doc_chunks = []
+                self.pending.append((path, meta, doc_chunks))
+
+    def flush(self):
+        chunks = [chunk for _, _, doc_chunks in self.pending for chunk in doc_chunks]
+        with metrics.span("embed"):
+            embeddings = embed_documents(chunks, self.config, self.model, self.cache) if chunks else []
+        if chunks and not embeddings:
+            # embed_documents logs and swallows errors; don't record these files as indexed.
+            raise RuntimeError("Embedding failed; index left unchanged")
+        offset = 0
+        with metrics.span("store"):
+            for path, meta, doc_chunks in self.pending:
+                # The rest of a file whose first chunks went out in the previous flush.
+                if path != self._described:
+                    self.writer.describe_file(path, **meta)
+                    self._described = path
+                self.writer.add(embeddings[offset:offset + len(doc_chunks)])
+                offset += len(doc_chunks)
+        self.chunks += len(chunks)
+        metrics.CHUNKS_INDEXED.inc(len(chunks))
+        self.pending, self.pending_chunks = [], 0
+
+def build_side_indexes(store, config):
+    """Derive the ANN index, quantized codes, token postings and near-duplicate
+    signatures for a segment before it is published."""
+    with metrics.span("ann_build"):
+        build_ann_index(store, config)
+    with metrics.span("postings_build"):
+        lexical = update_lexical_index(store)
+    with metrics.span("quantize"):
+        quantized = build_quantized(store, config)
+    with metrics.span("signatures"):
+        simhash = build_signatures(store)
+    return {"lexical": lexical, "quantized": quantized, "simhash": simhash}
+
+def run_indexing(full=False, job=None):
+    """Bring the index in line with source_folder.
+
+    Only new or changed files are parsed and embedded; rows of changed and deleted
+    files are tombstoned. `full=True` (or a changed model/vector dtype) rebuilds
+    everything into a fresh segment.
+
+    Files stream through parse (process pool) -> chunk -> embed (batched) -> append,
+    so memory use does not grow with the size of the corpus; large files are read
+    and chunked page by page (or record by record) as they are embedded.
+
+    `job` (a jobs.IndexJob) receives progress and can cancel the run between files;
+    a cancelled run aborts the writer and leaves the published index untouched.
+
+    Raises storage.IndexLocked if another process is indexing the same folder.
+    """
     config = load_config()
+    set_debug(config.get("debug_logging", False))
+    with writer_lock(config):
+        return _update_index(config, full, job)
+
+def _update_index(config, full, job):
     logger.info("Indexing started")
-    raw_docs = load_files(config)
-    if not raw_docs:
+    previous = None if full else load_index(config, lock_held=True)
+    if previous is not None and not can_append(previous, config):
+        logger.info("Index format, model or vector dtype changed; rebuilding from scratch")
+        previous = None
+
+    scanned = scan_source_files(config)
+    indexed = previous.live_files() if previous is not None else {}
+    changed, touched, deleted = plan_changes(scanned, indexed)
+    # Copies whose stored file is changing or going away must be stored themselves (or
+    # point at another copy) from now on.
+    leaving = set(changed) | set(deleted)
+    for path, entry in indexed.items():
+        if entry.get("duplicate_of") in leaving and path not in leaving:
+            changed[path] = touched.pop(path, None) or {key: entry.get(key) for key in ("size", "mtime", "hash")}
+    if not changed and not deleted and not touched:
         logger.info("No files to index.")
         return 0
+    logger.info(f"{len(changed)} new or changed, {len(deleted)} deleted, {len(scanned) - len(changed)} unchanged files")
+    if config.get("dedup_files", True):
+        to_parse, copies = assign_duplicates(changed, indexed, set(changed) | set(deleted))
+        if copies:
+            logger.info(f"{len(copies)} files are identical to another file and are stored once")
+    else:
+        to_parse, copies = changed, {}
+
+    if job is not None:
+        job.report(files_total=len(to_parse))
+    writer = IndexWriter(config, base=previous)
+    parsed = 0
+    cache = None
+    try:
+        for path in deleted:
+            writer.delete_file(path)
+        for path, meta in touched.items():
+            writer.touch_file(path, **meta)
+        for path in changed:
+            writer.delete_file(path)
+        for path, canonical in copies.items():
+            writer.describe_file(path, **changed[path], duplicate_of=canonical)
+
+        if to_parse and config.get("embedding_cache", True):
+            cache = EmbeddingCache(config)
+        model = get_model(config) if to_parse else None
+        tokenizer, max_seq_length = chunk_tokenizer(config, model) if model is not None else (None, None)
+        buffer = _EmbedBuffer(writer, config, model, cache)
+        for file_path, doc in iter_parsed_files(config, [scanned[path][0] for path in to_parse]):
+            path = str(file_path.resolve())
+            # Files without text are still recorded so they aren't re-parsed next run.
+            chunks = metrics.timed("chunk", iter_chunks(doc, config, tokenizer, max_seq_length)) if doc else []
+            parsed += doc is not None
+            metrics.FILES_INDEXED.inc(doc is not None)
+            buffer.add(path, to_parse[path], chunks)
+            if job is not None:
+                job.report(files_parsed=parsed, chunks_embedded=buffer.chunks)
+                job.check_cancelled()
+        buffer.flush()
+        if job is not None:
+            job.report(chunks_embedded=buffer.chunks)
+            job.check_cancelled()
+        logger.info(f"Indexed {buffer.chunks} chunks from {parsed} files")
+        with metrics.span("commit"):
+            info = writer.commit(before_publish=lambda store: build_side_indexes(store, config))
+    except Exception as e:
+        writer.abort()
+        if job is None or not job.cancel_requested:
+            logger.error(f"Indexing failed: {e}")
+        raise
+    finally:
+        if cache is not None:
+            cache.close()
+
+    remove_unused_parts(config["index_folder"], info)
 
-    chunks = chunk_documents(raw_docs, config)
-    print(f"Indexing {len(chunks)} chunks...")
-    embeddings = embed_documents(chunks, config)
-    save_index(embeddings, config)
+    dead = sum(end - start for entry in info["files"] if entry["deleted"] for start, end in [entry["rows"]])
+    if info["count"] and dead / info["count"] > config.get("compact_threshold", 0.3):
+        compact_index(config, before_publish=lambda store: build_side_indexes(store, config))
     logger.info("Indexing complete")
-    return len(raw_docs)
\ No newline at end of file
+    return parsed
@@ -0,0 +1,269 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from backend.logger import get_logger
+
+logger = get_logger()
+
+TOKEN_RE = re.compile(r"\w+")
+# Longer "words" are hashes, base64 and the like; not worth a vocabulary slot.
+MAX_TOKEN_BYTES = 64
+# Appends add a part each; past this many they are merged into one.
+MAX_PARTS = 8
+BUILD_BATCH_SIZE = 10000
+PART_ARRAYS = ("terms", "offsets", "rows", "tfs", "lengths")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(unicodedata.normalize("NFKD", text).lower())
+
+
+class PathIndex:
+    """Trigram index over the relative paths of indexed files, for filename search.
+
+    Built once per loaded index version from the file table, so a query touches
+    the posting lists of its trigrams instead of every chunk's filename.
+    """
+
+    def __init__(self, files, source_folder):
+        self.files = list(files)
+        self.keys = [os.path.relpath(path, source_folder).lower() for path in self.files]
+        grams = {}
+        for file_id, key in enumerate(self.keys):
+            for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                grams.setdefault(gram, []).append(file_id)
+        self.grams = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in grams.items()}
+
+    def match(self, query_lower):
+        """Files whose relative path contains the query, in index order."""
+        if not query_lower:
+            return []
+        if len(query_lower) < 3:
+            candidates = range(len(self.files))
+        else:
+            postings = []
+            for gram in {query_lower[i:i + 3] for i in range(len(query_lower) - 2)}:
+                ids = self.grams.get(gram)
+                if ids is None:
+                    return []
+                postings.append(ids)
+            postings.sort(key=len)
+            candidates = postings[0]
+            for ids in postings[1:]:
+                candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        # Trigrams only narrow it down; confirm the substring.
+        return [self.files[int(i)] for i in candidates if query_lower in self.keys[int(i)]]
+
+
+def _part_name(segment, start, end):
+    return f"{segment}.lex-{start}-{end}"
+
+
+def _part_paths(folder, name):
+    return {key: Path(folder) / f"{name}.{key}.npy" for key in PART_ARRAYS}
+
+
+def _write_part(folder, name, term_list, term_ids, rows, tfs, lengths):
+    """Write one part as CSR arrays: sorted terms, offsets into rows/tfs per term,
+    plus the token count of every row in the part (for BM25 length normalization)."""
+    order = np.argsort(np.asarray(term_list, dtype=object)) if term_list else np.zeros(0, np.int64)
+    rank = np.empty(len(term_list), dtype=np.int64)
+    rank[order] = np.arange(len(term_list))
+    sorted_ids = rank[term_ids]
+    by_term = np.lexsort((rows, sorted_ids))
+    counts = np.bincount(sorted_ids, minlength=len(term_list))
+    offsets = np.zeros(len(term_list) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    itemsize = max((len(term_list[i]) for i in order), default=1)
+    terms = np.array([term_list[i] for i in order], dtype=f"S{itemsize}")
+    paths = _part_paths(folder, name)
+    np.save(paths["terms"], terms)
+    np.save(paths["offsets"], offsets)
+    np.save(paths["rows"], rows[by_term].astype(np.int32))
+    np.save(paths["tfs"], tfs[by_term].astype(np.uint16))
+    np.save(paths["lengths"], np.asarray(lengths, dtype=np.uint32))
+
+
+def build_part(store, start, end):
+    """Tokenize rows [start, end) of `store` into a new postings part."""
+    vocab, term_list = {}, []
+    term_chunks, row_chunks, tf_chunks = [], [], []
+    lengths = np.zeros(end - start, dtype=np.uint32)
+    for batch_start in range(start, end, BUILD_BATCH_SIZE):
+        term_ids, rows, tfs = [], [], []
+        for row in range(batch_start, min(batch_start + BUILD_BATCH_SIZE, end)):
+            tokens = tokenize(store.text(row))
+            lengths[row - start] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                term = token.encode("utf-8")
+                if len(term) > MAX_TOKEN_BYTES:
+                    continue
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = vocab[term] = len(term_list)
+                    term_list.append(term)
+                term_ids.append(term_id)
+                rows.append(row)
+                tfs.append(min(tf, 65535))
+        term_chunks.append(np.asarray(term_ids, dtype=np.int64))
+        row_chunks.append(np.asarray(rows, dtype=np.int64))
+        tf_chunks.append(np.asarray(tfs, dtype=np.int64))
+    name = _part_name(store.info["segment"], start, end)
+    _write_part(store.folder, name, term_list,
+                np.concatenate(term_chunks) if term_chunks else np.zeros(0, np.int64),
+                np.concatenate(row_chunks) if row_chunks else np.zeros(0, np.int64),
+                np.concatenate(tf_chunks) if tf_chunks else np.zeros(0, np.int64), lengths)
+    return {"name": name, "start": start, "end": end}
+
+
+def merge_parts(folder, segment, parts):
+    """Merge postings parts covering consecutive row ranges into one, without re-tokenizing."""
+    vocab, term_list = {}, []
+    term_chunks, row_chunks, tf_chunks, length_chunks = [], [], [], []
+    for part in parts:
+        arrays = _load_part(folder, part["name"])
+        length_chunks.append(np.asarray(arrays["lengths"]))
+        ids = np.empty(len(arrays["terms"]), dtype=np.int64)
+        for i, term in enumerate(arrays["terms"]):
+            term = bytes(term)
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = vocab[term] = len(term_list)
+                term_list.append(term)
+            ids[i] = term_id
+        counts = np.diff(arrays["offsets"])
+        term_chunks.append(np.repeat(ids, counts))
+        row_chunks.append(np.asarray(arrays["rows"], dtype=np.int64))
+        tf_chunks.append(np.asarray(arrays["tfs"], dtype=np.int64))
+    start, end = parts[0]["start"], parts[-1]["end"]
+    name = _part_name(segment, start, end)
+    _write_part(folder, name, term_list, np.concatenate(term_chunks), np.concatenate(row_chunks),
+                np.concatenate(tf_chunks), np.concatenate(length_chunks))
+    return {"name": name, "start": start, "end": end}
+
+
+def update_lexical_index(store):
+    """Postings parts covering every row of `store`, adding (and merging) parts as needed.
+
+    Returns the new part list for index.json.
+    """
+    parts = list(store.info.get("lexical", []))
+    if any(not path.exists() for part in parts for path in _part_paths(store.folder, part["name"]).values()):
+        # Parts written before row lengths were stored (or damaged); rebuild them.
+        logger.info("Rebuilding postings for the whole index")
+        parts = []
+    covered = parts[-1]["end"] if parts else 0
+    if covered < len(store):
+        parts.append(build_part(store, covered, len(store)))
+    if len(parts) > MAX_PARTS:
+        logger.info(f"Merging {len(parts)} postings parts")
+        parts = [merge_parts(store.folder, store.info["segment"], parts)]
+    return parts
+
+
+def remove_unused_parts(folder, info):
+    """Delete postings files of this segment that the published index no longer lists."""
+    keep = {part["name"] for part in info.get("lexical", [])}
+    for path in Path(folder).glob(f"{info['segment']}.lex-*.npy"):
+        if path.name.rsplit(".", 2)[0] not in keep:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not remove old postings file {path}: {e}")
+
+
+def _load_part(folder, name):
+    return {key: np.load(path, mmap_mode="r") for key, path in _part_paths(folder, name).items()}
+
+
+class LexicalIndex:
+    """Memory-mapped token postings (row ids and term frequencies) over chunk text."""
+
+    def __init__(self, store):
+        self.parts = [_load_part(store.folder, part["name"]) for part in store.info.get("lexical", [])]
+        # Parts cover consecutive row ranges from 0, so this is indexed by row.
+        self.lengths = np.concatenate([np.asarray(part["lengths"], dtype=np.float32) for part in self.parts])
+        self.live = store.live
+        live_lengths = self.lengths if store.live is None else self.lengths[store.live]
+        self.num_docs = len(live_lengths)
+        self.avg_length = float(live_lengths.mean()) if len(live_lengths) else 0.0
+
+    def postings(self, token):
+        """(rows, tfs) for a token across all parts; rows are ascending."""
+        term = token.encode("utf-8")
+        rows, tfs = [], []
+        for part in self.parts:
+            terms = part["terms"]
+            i = int(np.searchsorted(terms, term))
+            if i < len(terms) and terms[i] == term:
+                start, end = part["offsets"][i], part["offsets"][i + 1]
+                rows.append(part["rows"][start:end])
+                tfs.append(part["tfs"][start:end])
+        if not rows:
+            return np.zeros(0, np.int32), np.zeros(0, np.uint16)
+        return np.concatenate(rows), np.concatenate(tfs)
+
+    def rows_with_all(self, tokens):
+        """Rows whose text contains every token."""
+        postings = sorted((self.postings(token)[0] for token in set(tokens)), key=len)
+        if not postings:
+            return np.zeros(0, np.int32)
+        rows = postings[0]
+        for other in postings[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def bm25(self, tokens, top_k, k1=1.2, b=0.75, allowed=None):
+        """Top-k (row, score) pairs by Okapi BM25 over live rows, best first.
+
+        `allowed` (a row mask, e.g. from a metadata filter) narrows the rows that
+        can match; term statistics still come from the whole index.
+        """
+        if not tokens or not self.num_docs:
+            return []
+        rows_list, weights_list = [], []
+        for token, query_tf in Counter(tokens).items():
+            rows, tfs = self.postings(token)
+            if self.live is not None and len(rows):
+                keep = self.live[rows]
+                rows, tfs = rows[keep], tfs[keep]
+            idf = np.log1p((self.num_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            if allowed is not None and len(rows):
+                keep = allowed[rows]
+                rows, tfs = rows[keep], tfs[keep]
+            if not len(rows):
+                continue
+            tfs = tfs.astype(np.float32)
+            norm = k1 * (1 - b + b * self.lengths[rows] / max(self.avg_length, 1e-9))
+            rows_list.append(rows)
+            weights_list.append(query_tf * idf * tfs * (k1 + 1) / (tfs + norm))
+        if not rows_list:
+            return []
+        # Sum per-token contributions over the (small) union of matching rows.
+        rows, inverse = np.unique(np.concatenate(rows_list), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights_list))
+        k = min(top_k, len(rows))
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+def load_lexical_index(store):
+    """LexicalIndex for `store`, or None if it was built before postings existed."""
+    if store is None or not store.info.get("lexical"):
+        return None
+    if store.info["lexical"][-1]["end"] != len(store):
+        logger.warning("Postings do not cover the whole index; keyword lookups fall back to scanning")
+        return None
+    try:
+        return LexicalIndex(store)
+    except FileNotFoundError as e:
+        logger.warning(f"Postings are incomplete ({e}); run a full reindex to rebuild them")
+        return None
@@ -0,0 +1,300 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from backend.logger import get_logger
+from backend.storage import lock_file, unlock_file
+
+logger = get_logger()
+
+ACTIVE_STATES = ("queued", "running")
+# Fields of IndexJob that make up its state, shared between API workers through a JobStore.
+STATE_FIELDS = ("id", "full", "state", "status", "error", "created_at", "started_at", "finished_at",
+                "files_total", "files_parsed", "chunks_embedded")
+# Least time between progress writes to the JobStore.
+SAVE_INTERVAL = 0.5
+JOB_ID_RE = re.compile(r"[0-9a-f]{12}")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class IndexJob:
+    """State of one background reindex run, updated by the indexer as it goes."""
+
+    def __init__(self, full=False, store=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.full = full
+        self.state = "queued"
+        self.status = "Indexing queued."
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files_total = 0
+        self.files_parsed = 0
+        self.chunks_embedded = 0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._store = store
+        self._saved_at = 0.0
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls()
+        for field in STATE_FIELDS:
+            setattr(job, field, state[field])
+        return job
+
+    def state_dict(self):
+        with self._lock:
+            return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def save(self, force=False):
+        """Write the job's state to its store (at most every SAVE_INTERVAL unless `force`)."""
+        if self._store is None or (not force and time.time() - self._saved_at < SAVE_INTERVAL):
+            return
+        self._saved_at = time.time()
+        self._store.save(self)
+
+    # Called from the indexing thread.
+    def report(self, files_total=None, files_parsed=None, chunks_embedded=None):
+        with self._lock:
+            if files_total is not None:
+                self.files_total = files_total
+            if files_parsed is not None:
+                self.files_parsed = files_parsed
+            if chunks_embedded is not None:
+                self.chunks_embedded = chunks_embedded
+        self.save()
+
+    def check_cancelled(self):
+        if not self._cancel.is_set() and self._store is not None and self._store.cancel_requested(self.id):
+            self._cancel.set()
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        return self.state in ACTIVE_STATES
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            files_per_s = self.files_parsed / elapsed if elapsed else 0.0
+            remaining = self.files_total - self.files_parsed
+            eta = remaining / files_per_s if files_per_s and self.state == "running" else None
+            return {
+                "job_id": self.id,
+                "state": self.state,
+                "status": self.status,
+                "error": self.error,
+                "full": self.full,
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "chunks_embedded": self.chunks_embedded,
+                "elapsed_s": round(elapsed, 2),
+                "files_per_s": round(files_per_s, 2),
+                "chunks_per_s": round(self.chunks_embedded / elapsed, 2) if elapsed else 0.0,
+                "eta_s": round(eta, 1) if eta is not None else None,
+            }
+
+
+class JobStore:
+    """Reindex jobs shared by API worker processes, as files under <index_folder>/jobs.
+
+    <id>.json holds the state last saved by the worker running the job, and an
+    <id>.cancel file asks that worker to stop. The runner holds an OS lock on
+    <id>.lock while the job is active, so a job whose worker died is reported
+    as failed instead of blocking every later reindex.
+    """
+
+    def __init__(self, index_folder):
+        self.folder = Path(index_folder) / "jobs"
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, job_id, suffix):
+        return self.folder / f"{job_id}{suffix}"
+
+    @contextmanager
+    def submitting(self):
+        """Lock held while checking for an active job and creating a new one."""
+        lock = lock_file(self.folder / "submit.lock", wait=True)
+        try:
+            yield
+        finally:
+            unlock_file(lock)
+
+    def hold(self, job_id):
+        """Mark the job as owned by this process until release(); returns the lock."""
+        return lock_file(self._path(job_id, ".lock"))
+
+    def release(self, lock):
+        unlock_file(lock)
+
+    def save(self, job):
+        path = self._path(job.id, ".json")
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job.state_dict(), f)
+        os.replace(tmp, path)
+
+    def load(self, job_id):
+        if not JOB_ID_RE.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id, ".json"), encoding="utf-8") as f:
+                job = IndexJob.from_state(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+        if job.active and not self._owned(job_id):
+            job.state, job.status = "failed", "Indexing failed."
+            job.error = "The worker running this job exited."
+            job.finished_at = job.finished_at or time.time()
+        return job
+
+    def _owned(self, job_id):
+        try:
+            lock = lock_file(self._path(job_id, ".lock"))
+        except OSError:
+            return True
+        unlock_file(lock)
+        return False
+
+    def active(self):
+        return next((job for job in map(self.load, self._job_ids()) if job is not None and job.active), None)
+
+    def request_cancel(self, job_id):
+        self._path(job_id, ".cancel").touch()
+
+    def cancel_requested(self, job_id):
+        return self._path(job_id, ".cancel").exists()
+
+    def prune(self, history):
+        """Delete the files of finished jobs beyond the newest `history`."""
+        for job_id in self._job_ids()[:-history]:
+            job = self.load(job_id)
+            if job is not None and job.active:
+                continue
+            for suffix in (".json", ".cancel", ".lock"):
+                try:
+                    self._path(job_id, suffix).unlink(missing_ok=True)
+                except OSError:
+                    pass
+
+    def _job_ids(self):
+        """Job ids, oldest first."""
+        jobs = []
+        for path in self.folder.glob("*.json"):
+            try:
+                jobs.append((path.stat().st_mtime, path.stem))
+            except FileNotFoundError:
+                continue  # pruned by another worker
+        return [job_id for _, job_id in sorted(jobs)]
+
+
+class JobManager:
+    """Runs reindex jobs one at a time on a background thread.
+
+    A new job is rejected while another is queued or running; callers get the
+    active job back instead. `on_success` runs after a job publishes its index
+    (the API uses it to swap the search engine to the new version).
+
+    With a `store` (several API workers), jobs are shared through it: any worker
+    can report on or cancel a job another one is running, and a job running in
+    any worker rejects new ones.
+    """
+
+    def __init__(self, run, on_success=None, history=20, store=None):
+        self._run = run
+        self._on_success = on_success
+        self._history = history
+        self._store = store
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+        self._jobs = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def active(self):
+        with self._lock:
+            return next((job for job in self._jobs.values() if job.active), None)
+
+    def submit(self, full=False):
+        """Queue a job; returns (job, created) where created is False if one was already active."""
+        with self._lock, (self._store.submitting() if self._store is not None else nullcontext()):
+            running = next((job for job in self._jobs.values() if job.active), None)
+            if running is None and self._store is not None:
+                running = self._store.active()
+            if running is not None:
+                return running, False
+            job = IndexJob(full=full, store=self._store)
+            self._jobs[job.id] = job
+            for old in list(self._jobs)[:-self._history]:
+                if not self._jobs[old].active:
+                    del self._jobs[old]
+            if self._store is not None:
+                self._owners[job.id] = self._store.hold(job.id)
+                job.save(force=True)
+                self._store.prune(self._history)
+        self._executor.submit(self._execute, job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            job = self._store.load(job_id)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.active:
+            job.cancel()
+            if self._store is not None:
+                self._store.request_cancel(job_id)
+        return job
+
+    def _execute(self, job):
+        job.state, job.status, job.started_at = "running", "Indexing started.", time.time()
+        try:
+            job.save(force=True)
+            job.check_cancelled()
+            count = self._run(full=job.full, job=job)
+            if self._on_success is not None:
+                self._on_success()
+            job.status = "No files to index." if count == 0 else f"{count} file{'s' if count != 1 else ''} indexed."
+            job.state = "completed"
+        except JobCancelled:
+            job.state, job.status = "cancelled", "Indexing cancelled."
+        except Exception as e:
+            logger.error(f"Reindex job {job.id} failed: {e}")
+            job.state, job.status, job.error = "failed", "Indexing failed.", str(e)
+        finally:
+            job.finished_at = time.time()
+            try:
+                job.save(force=True)
+            finally:
+                owner = self._owners.pop(job.id, None)
+                if owner is not None:
+                    self._store.release(owner)
+
+    def shutdown(self):
+        job = self.active()
+        if job is not None:
+            job.cancel()
+        self._executor.shutdown(wait=False)
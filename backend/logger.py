@@ -9,3 +9,7 @@ def get_logger(name="smartsearch"):
         logger.addHandler(handler)
         logger.setLevel(logging.INFO)
     return logger
+
+def set_debug(enabled, name="smartsearch"):
+    """Turn per-file/per-chunk debug logging on or off (config debug_logging)."""
+    get_logger(name).setLevel(logging.DEBUG if enabled else logging.INFO)
@@ -2,7 +2,16 @@ import uvicorn
 import multiprocessing
 import sys
 
+from backend.config import load_config
+
 def run():
+    workers = load_config().get("serve_workers", 1)
+    if workers > 1:
+        # uvicorn's supervisor spawns the workers; they share the listening socket,
+        # and each maps the same index files read-only, so the page cache holds one
+        # copy of the vectors however many workers there are.
+        uvicorn.run("backend.api:app", host="127.0.0.1", port=8001, log_level="debug", workers=workers)
+        return
     config = uvicorn.Config(
         "backend.api:app",
         host="127.0.0.1",
@@ -0,0 +1,45 @@
+import hashlib
+from pathlib import Path
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_source_files(config):
+    """Indexable files under source_folder as {resolved path: (Path, os.stat_result)}."""
+    folder = Path(config["source_folder"])
+    extensions = config["supported_extensions"]
+    found = {}
+    for file_path in folder.rglob("*"):
+        if file_path.suffix.lower() in extensions and file_path.is_file():
+            found[str(file_path.resolve())] = (file_path, file_path.stat())
+    return found
+
+
+def plan_changes(scanned, indexed):
+    """Compare a scan with the manifest of the current index.
+
+    Returns (changed, touched, deleted): files to (re)parse mapped to their new
+    manifest metadata, unchanged files whose mtime moved mapped to refreshed
+    metadata, and paths that disappeared from the source folder. Size and mtime
+    are checked first; the content hash is only computed when they differ.
+    """
+    changed, touched = {}, {}
+    for path, (file_path, stat) in scanned.items():
+        entry = indexed.get(path)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            continue
+        meta = {"size": stat.st_size, "mtime": stat.st_mtime, "hash": file_hash(file_path)}
+        if entry and entry.get("hash") == meta["hash"]:
+            touched[path] = meta
+        else:
+            changed[path] = meta
+    deleted = [path for path in indexed if path not in scanned]
+    return changed, touched, deleted
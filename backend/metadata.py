@@ -0,0 +1,95 @@
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+FILTER_KEYS = ("type", "path_prefix", "modified_after", "modified_before", "min_size", "max_size")
+
+
+def active_filters(filters: Optional[Dict]) -> Dict:
+    """The filters that actually constrain anything (None and empty values dropped)."""
+    if not filters:
+        return {}
+    return {key: filters[key] for key in FILTER_KEYS if filters.get(key) not in (None, "", [])}
+
+
+def _prefix_key(path):
+    return path.replace(os.sep, "/").replace("\\", "/").lower()
+
+
+class FileMetadata:
+    """Columnar view of the per-file metadata in index.json, for pre-filtering searches.
+
+    One entry per file id: the file's contiguous row range, size, mtime, type
+    (extension) and path relative to source_folder. Built once per loaded index
+    version; a filter is evaluated over files (not chunks) and expanded to the
+    rows of the matching files, so scoring only touches rows in scope.
+    """
+
+    def __init__(self, store, source_folder):
+        entries = store.file_entries
+        self.count = len(store)
+        self.live = np.array([not e.get("deleted") and "rows" in e for e in entries], dtype=bool)
+        rows = [e.get("rows") or (0, 0) for e in entries]
+        self.starts = np.array([start for start, _ in rows], dtype=np.int64)
+        self.ends = np.array([end for _, end in rows], dtype=np.int64)
+        # Entries migrated from embeddings.json have no size/mtime; NaN never matches a range.
+        self.sizes = np.array([np.nan if e.get("size") is None else e["size"] for e in entries], dtype=np.float64)
+        self.mtimes = np.array([np.nan if e.get("mtime") is None else e["mtime"] for e in entries], dtype=np.float64)
+        self.types = np.array([os.path.splitext(e["path"])[1].lower().lstrip(".") for e in entries], dtype=str)
+        self.keys = [_prefix_key(os.path.relpath(e["path"], source_folder)) for e in entries]
+        # For copies stored once (see backend.dedup): file id of the live stored file, else -1.
+        ids = {e["path"]: i for i, e in enumerate(entries) if self.live[i] and not e.get("duplicate_of")}
+        self.canonical = np.array([ids.get(e.get("duplicate_of"), -1) for e in entries], dtype=np.int64)
+
+    def select_files(self, filters: Dict) -> np.ndarray:
+        """Boolean mask over file ids of live files matching every filter."""
+        mask = self.live.copy()
+        if filters.get("type"):
+            types = filters["type"]
+            types = types.split(",") if isinstance(types, str) else types
+            mask &= np.isin(self.types, [t.strip().lower().lstrip(".") for t in types])
+        with np.errstate(invalid="ignore"):
+            if filters.get("modified_after") is not None:
+                mask &= self.mtimes >= filters["modified_after"]
+            if filters.get("modified_before") is not None:
+                mask &= self.mtimes < filters["modified_before"]
+            if filters.get("min_size") is not None:
+                mask &= self.sizes >= filters["min_size"]
+            if filters.get("max_size") is not None:
+                mask &= self.sizes <= filters["max_size"]
+        if filters.get("path_prefix"):
+            prefix = _prefix_key(filters["path_prefix"]).lstrip("/")
+            for file_id in np.flatnonzero(mask):
+                if not self.keys[file_id].startswith(prefix):
+                    mask[file_id] = False
+        return mask
+
+    def select_rows(self, filters: Dict) -> np.ndarray:
+        """Sorted row ids of chunks in files matching every filter.
+
+        A matching copy of another file contributes that file's rows.
+        """
+        mask = self.select_files(filters)
+        stored = self.canonical[mask]
+        if (stored >= 0).any():
+            mask[stored[stored >= 0]] = True
+        return self.rows_of(mask)
+
+    def rows_of(self, file_mask: np.ndarray) -> np.ndarray:
+        """Sorted row ids of the chunks of the files set in `file_mask`."""
+        file_ids = np.flatnonzero(file_mask)
+        if not len(file_ids):
+            return np.zeros(0, dtype=np.int64)
+        starts, ends = self.starts[file_ids], self.ends[file_ids]
+        lengths = ends - starts
+        # Concatenated aranges: each row is its file's start plus its offset within the file.
+        offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(starts, lengths) + np.arange(int(lengths.sum())) - offsets
+        rows.sort()
+        return rows
+
+    def row_mask(self, rows: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.count, dtype=bool)
+        mask[rows] = True
+        return mask
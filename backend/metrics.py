@@ -0,0 +1,149 @@
+"""In-process counters, latency histograms and timing spans, exported in Prometheus text format.
+
+    with span("embed"):
+        ...
+
+records the block's duration in the `smartsearch_stage_seconds` histogram and,
+while a request is being profiled (see `profile()`), in that request's breakdown.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; fine at the low end, where query stages live.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_profile = contextvars.ContextVar("profile", default=None)
+# Set when several API workers serve the same port (see set_worker).
+_worker = None
+
+
+def set_worker(worker):
+    """Label every exported series with worker="<worker>".
+
+    Each API worker keeps its own counters and a scrape reaches one worker at a
+    time, so without the label the series would jump between processes. Sum over
+    the label (e.g. `sum without (worker) (rate(...))`) for the whole server.
+    """
+    global _worker
+    _worker = worker
+
+
+def _label_text(names, values):
+    if _worker is not None:
+        names, values = ("worker",) + tuple(names), (_worker,) + tuple(values)
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            # [per-bucket counts..., sum, count]
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {state[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("smartsearch_stage_seconds", "Time spent per indexing/search stage.", ["stage"])
+HTTP_REQUEST_SECONDS = Histogram("smartsearch_http_request_seconds", "HTTP request latency.", ["method", "route", "status"])
+FILES_INDEXED = Counter("smartsearch_files_indexed_total", "Files parsed by indexing runs.")
+CHUNKS_INDEXED = Counter("smartsearch_chunks_indexed_total", "Chunks embedded and stored by indexing runs.")
+SEARCH_QUERIES = Counter("smartsearch_search_queries_total", "Queries answered, per endpoint.", ["endpoint"])
+QUERY_CACHE = Counter("smartsearch_query_cache_total", "Query embedding cache lookups.", ["result"])
+RESULT_CACHE = Counter("smartsearch_result_cache_total", "Search result cache lookups.", ["result"])
+
+REGISTRY = [STAGE_SECONDS, HTTP_REQUEST_SECONDS, FILES_INDEXED, CHUNKS_INDEXED, SEARCH_QUERIES, QUERY_CACHE,
+            RESULT_CACHE]
+
+
+def observe(stage, seconds):
+    """Record a stage duration measured elsewhere (e.g. in a parse worker)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    breakdown = _profile.get()
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed(stage, iterable):
+    """Yield from `iterable`, recording the time spent producing its items (not the
+    caller's time between them) as one `stage` observation once it is exhausted."""
+    seconds = 0.0
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            seconds += time.perf_counter() - start
+        yield item
+    observe(stage, seconds)
+
+
+@contextmanager
+def profile():
+    """Collect {stage: seconds} for spans run in this context (and threads started from it)."""
+    breakdown = {}
+    token = _profile.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _profile.reset(token)
+
+
+def render():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
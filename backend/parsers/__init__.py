@@ -1,16 +1,31 @@
-from . import pdf_parser, json_parser, image_parser, docx_parser, html_parser
+import importlib
 
+# Parser modules are imported on first use: image_parser pulls in torch/transformers,
+# which most processes (API server, parse workers that never see an image) don't need.
 PARSERS = {
-    ".pdf": pdf_parser,
-    ".json": json_parser,
-    ".jpg": image_parser,
-    ".jpeg": image_parser,
-    ".png": image_parser,
-    ".docx": docx_parser,
-    ".doc": docx_parser,
-    ".html": html_parser,
-    ".htm": html_parser
+    ".pdf": "pdf_parser",
+    ".json": "json_parser",
+    ".jpg": "image_parser",
+    ".jpeg": "image_parser",
+    ".png": "image_parser",
+    ".docx": "docx_parser",
+    ".doc": "docx_parser",
+    ".html": "html_parser",
+    ".htm": "html_parser"
 }
 
 def get_parser(ext):
-    return PARSERS.get(ext.lower())
\ No newline at end of file
+    name = PARSERS.get(ext.lower())
+    if name is None:
+        return None
+    return importlib.import_module(f"{__name__}.{name}")
+
+def iter_sections(parser, path):
+    """(page, text) pieces of a file, in order. page is a 1-based page number, or None.
+
+    Parsers that can read a file incrementally (pages, records, blocks of markup)
+    provide iter_sections(); for the others the whole parse() result is one piece.
+    """
+    if hasattr(parser, "iter_sections"):
+        return parser.iter_sections(path)
+    return iter([(None, parser.parse(path))])
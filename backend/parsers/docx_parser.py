@@ -1,5 +1,9 @@
 from docx import Document
 
-def parse(path):
+def iter_sections(path):
     doc = Document(str(path))
-    return "\n".join([para.text for para in doc.paragraphs])
\ No newline at end of file
+    for para in doc.paragraphs:
+        yield None, para.text
+
+def parse(path):
+    return "\n".join(text for _, text in iter_sections(path))
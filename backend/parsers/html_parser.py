@@ -1,7 +1,56 @@
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 
-def parse(path):
+READ_SIZE = 1 << 16
+# Extracted text is handed on once this much has accumulated.
+SECTION_CHARS = 1 << 16
+SKIPPED_TAGS = {"script", "style"}
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text nodes as the markup is fed in, without building a tree."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.size = 0
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+            self.size += len(data)
+
+    def take(self, final=False):
+        """Text collected so far, up to its last whitespace unless `final` (so no word is split)."""
+        text = "".join(self.parts)
+        cut = len(text) if final else max(text.rfind(" "), text.rfind("\n")) + 1
+        if cut <= 0:
+            cut = len(text)
+        self.parts, self.size = [text[cut:]], len(text) - cut
+        return text[:cut]
+
+
+def iter_sections(path):
+    """Yield the document's text in pieces of about SECTION_CHARS, reading the file incrementally."""
+    extractor = _TextExtractor()
     with open(path, 'r', encoding='utf-8') as f:
-        html = f.read()
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.get_text()
\ No newline at end of file
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            extractor.feed(block)
+            if extractor.size >= SECTION_CHARS:
+                yield None, extractor.take()
+    extractor.close()
+    yield None, extractor.take(final=True)
+
+def parse(path):
+    return "".join(text for _, text in iter_sections(path))
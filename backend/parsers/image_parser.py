@@ -1,10 +1,24 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 from PIL import Image, ExifTags
-import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration
 
-processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+CAPTION_MODEL = "Salesforce/blip-image-captioning-base"
+_caption_model = None
+_caption_lock = threading.Lock()
+
+def get_caption_model():
+    """Load BLIP on first use and share it for the life of the process."""
+    global _caption_model
+    if _caption_model is None:
+        with _caption_lock:
+            if _caption_model is None:
+                from transformers import BlipProcessor, BlipForConditionalGeneration
+                _caption_model = (
+                    BlipProcessor.from_pretrained(CAPTION_MODEL),
+                    BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL),
+                )
+    return _caption_model
 
 def extract_exif(image):
     exif_data = image._getexif()
@@ -17,10 +31,63 @@ def extract_exif(image):
     return "\n".join(f"{k}: {v}" for k, v in exif.items())
 
 def caption_image(image):
+    processor, model = get_caption_model()
     inputs = processor(images=image, return_tensors="pt")
     out = model.generate(**inputs)
     return processor.decode(out[0], skip_special_tokens=True)
 
+def caption_images(images):
+    """Caption several images with one BLIP generate call."""
+    processor, model = get_caption_model()
+    inputs = processor(images=[image.convert("RGB") for image in images], return_tensors="pt")
+    out = model.generate(**inputs)
+    return [processor.decode(o, skip_special_tokens=True) for o in out]
+
+def _ocr(path):
+    """OCR text and EXIF for one image; the image is kept only if it needs a caption."""
+    try:
+        image = Image.open(path)
+        text = pytesseract.image_to_string(image)
+        meta = extract_exif(image)
+        return text, meta, None if text.strip() else image
+    except Exception as e:
+        return f"Image parsing failed: {e}", None, None
+
+def parse_batch(paths, ocr_workers=4, caption_batch_size=8):
+    """Throughput mode for indexing: yields (path, text) like parse() for many images.
+
+    tesseract runs in its own process per call, so OCR fans out over a thread pool;
+    images without OCR text are captioned caption_batch_size at a time. Paths are
+    consumed in windows so only a bounded number of images is held open.
+    """
+    paths = list(paths)
+    to_caption = []
+
+    def flush():
+        try:
+            captions = caption_images([image for _, _, image in to_caption])
+            results = [(path, f"{caption}\n\nMetadata:\n{meta}") for (path, meta, _), caption in zip(to_caption, captions)]
+        except Exception as e:
+            results = [(path, f"Image parsing failed: {e}") for path, _, _ in to_caption]
+        to_caption.clear()
+        return results
+
+    window = max(ocr_workers, caption_batch_size) * 2
+    with ThreadPoolExecutor(max_workers=ocr_workers) as pool:
+        for start in range(0, len(paths), window):
+            batch = paths[start:start + window]
+            for path, (text, meta, image) in zip(batch, pool.map(_ocr, batch)):
+                if meta is None:
+                    yield path, text
+                elif image is None:
+                    yield path, f"{text}\n\nMetadata:\n{meta}"
+                else:
+                    to_caption.append((path, meta, image))
+                    if len(to_caption) >= caption_batch_size:
+                        yield from flush()
+        if to_caption:
+            yield from flush()
+
 def parse(path):
     try:
         image = Image.open(path)
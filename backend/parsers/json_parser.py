@@ -1,6 +1,95 @@
 import json
 
-def parse(path):
+READ_SIZE = 1 << 16
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = ",]}" + _WHITESPACE
+
+
+class _Reader:
+    """A text buffer over a file that is refilled as the decoder needs more input."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self, size=READ_SIZE):
+        if self.eof:
+            return False
+        # Drop what has been consumed so the buffer stays about one record long.
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        block = self.f.read(max(size, len(self.buf)))
+        if not block:
+            self.eof = True
+            return False
+        self.buf += block
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (not consumed), or "" at the end of the file."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # A number cut off by the end of the buffer ("12" of "12.5") continues in the next block.
+            if (end == len(self.buf) or (isinstance(value, (int, float)) and self.buf[end] not in _DELIMITERS)) \
+                    and self.more():
+                continue
+            self.pos = end
+            return value
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON at offset {self.pos}")
+        self.pos += 1
+
+
+def iter_records(f):
+    """Yield the top-level items of a JSON document one at a time.
+
+    Array elements come out as they are, object members as one-key objects; any
+    other document is yielded whole. Only one item is held in memory at a time.
+    """
+    reader = _Reader(f)
+    opening = reader.peek()
+    if opening not in ("[", "{"):
+        yield reader.value()
+        return
+    closing = "]" if opening == "[" else "}"
+    reader.expect(opening)
+    if reader.peek() == closing:
+        return
+    while True:
+        if opening == "[":
+            yield reader.value()
+        else:
+            key = reader.value()
+            reader.expect(":")
+            yield {key: reader.value()}
+        if reader.peek() == closing:
+            return
+        reader.expect(",")
+
+
+def iter_sections(path):
     with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return json.dumps(data, indent=2)
\ No newline at end of file
+        for record in iter_records(f):
+            yield None, json.dumps(record, indent=2)
+
+def parse(path):
+    return "\n".join(text for _, text in iter_sections(path))
@@ -1,5 +1,10 @@
 from PyPDF2 import PdfReader
 
-def parse(path):
+def iter_sections(path):
+    """Yield (page number, text) one page at a time; PdfReader only decodes the pages asked for."""
     reader = PdfReader(str(path))
-    return "\n".join([page.extract_text() or "" for page in reader.pages])
\ No newline at end of file
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+def parse(path):
+    return "\n".join(text for _, text in iter_sections(path))
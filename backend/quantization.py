@@ -0,0 +1,185 @@
+"""Compressed copies of the vector store for a cheap first scoring pass.
+
+int8 keeps one signed byte per dimension with a per-dimension scale; binary keeps
+one sign bit per dimension and is searched by Hamming distance. Codes are written
+next to the segment (`<segment>.int8` / `<segment>.binary`) and appended to like
+the segment itself; full-precision vectors stay on disk and are only read to
+rescore the first pass's best candidates.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+
+from backend.logger import get_logger
+
+logger = get_logger()
+
+QUANTIZATION_TYPES = ("int8", "binary")
+ENCODE_BATCH_SIZE = 65536
+SCORE_BATCH_SIZE = 65536
+# Rows sampled to fit the int8 scales.
+SCALE_SAMPLE_SIZE = 100000
+# Bits set per byte value, for Hamming distance on packed sign codes.
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantization_type(config):
+    kind = config.get("vector_quantization", "none")
+    return kind if kind in QUANTIZATION_TYPES else None
+
+
+def codes_path(folder, segment, kind):
+    return Path(folder) / f"{segment}.{kind}"
+
+
+def code_width(kind, dim):
+    return dim if kind == "int8" else (dim + 7) // 8
+
+
+def encode(kind, vectors, scale=None):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if kind == "int8":
+        return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _fit_scale(store):
+    rows = np.arange(len(store))
+    if len(rows) > SCALE_SAMPLE_SIZE:
+        rows = np.sort(np.random.default_rng(0).choice(rows, SCALE_SAMPLE_SIZE, replace=False))
+    sample = np.asarray(store.vectors[rows], dtype=np.float32)
+    return np.maximum(np.abs(sample).max(axis=0), 1e-6) / 127.0
+
+
+def build_quantized(store, config):
+    """Write (or extend) the configured codes for all rows of `store`.
+
+    Returns the index.json entry describing them, or None when quantization is off.
+    Codes already written for the segment are kept when the kind matches, and only
+    new rows are encoded (with the scales fitted on the first build).
+    """
+    kind = quantization_type(config)
+    previous = store.info.get("quantized")
+    for other in QUANTIZATION_TYPES:
+        if other != kind and codes_path(store.folder, store.info["segment"], other).exists():
+            codes_path(store.folder, store.info["segment"], other).unlink()
+    if kind is None or len(store) == 0:
+        return None
+    path = codes_path(store.folder, store.info["segment"], kind)
+    width = code_width(kind, store.dim)
+    if previous and previous["kind"] == kind and previous["rows"] <= len(store) and path.exists():
+        start, scale = previous["rows"], previous.get("scale")
+        scale = np.asarray(scale, dtype=np.float32) if scale is not None else None
+        logger.info(f"Adding {len(store) - start} vectors to {kind} codes")
+        target = open(path, "r+b")
+        target.truncate(start * width)
+        target.seek(start * width)
+    else:
+        start = 0
+        scale = _fit_scale(store) if kind == "int8" else None
+        logger.info(f"Quantizing {len(store)} vectors to {kind}")
+        # Readers may have the old codes mapped; write a new file and swap it in.
+        target = open(path.with_name(path.name + ".tmp"), "wb")
+    with target:
+        for i in range(start, len(store), ENCODE_BATCH_SIZE):
+            target.write(encode(kind, store.vectors[i:i + ENCODE_BATCH_SIZE], scale).tobytes())
+        target.flush()
+        os.fsync(target.fileno())
+    if start == 0:
+        os.replace(path.with_name(path.name + ".tmp"), path)
+    entry = {"kind": kind, "rows": len(store)}
+    if scale is not None:
+        entry["scale"] = [float(s) for s in scale]
+    return entry
+
+
+class QuantizedVectors:
+    """Memory-mapped codes for a published index, scored in place of the full vectors."""
+
+    def __init__(self, store):
+        info = store.info["quantized"]
+        self.kind = info["kind"]
+        self.dim = store.dim
+        shape = (info["rows"], code_width(self.kind, store.dim))
+        path = codes_path(store.folder, store.info["segment"], self.kind)
+        self.codes = np.memmap(path, dtype=np.int8 if self.kind == "int8" else np.uint8, mode="r", shape=shape)
+        self.scale = np.asarray(info["scale"], dtype=np.float32) if "scale" in info else None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, query, rows=None):
+        """Approximate similarity of a unit-length query to every row (or to `rows`).
+
+        int8 scores are dot products with the dequantized vectors; binary scores are
+        dim - 2 * Hamming distance, which grows with the cosine between sign patterns.
+        """
+        count = len(self) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        if self.kind == "int8":
+            weights = np.asarray(query, dtype=np.float32) * self.scale
+        else:
+            bits = np.packbits(np.asarray(query) > 0)
+        for i in range(0, count, SCORE_BATCH_SIZE):
+            codes = self.codes[i:i + SCORE_BATCH_SIZE] if rows is None else self.codes[rows[i:i + SCORE_BATCH_SIZE]]
+            if self.kind == "int8":
+                scores[i:i + SCORE_BATCH_SIZE] = codes.astype(np.float32) @ weights
+            else:
+                distance = POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+                scores[i:i + SCORE_BATCH_SIZE] = self.dim - 2 * distance
+        return scores
+
+    def _score_block(self, queries, start, end):
+        """(queries x rows[start:end]) approximate scores, one pass over the slice of codes."""
+        codes = self.codes[start:end]
+        if self.kind == "int8":
+            return (queries * self.scale) @ codes.astype(np.float32).T
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for i, bits in enumerate(np.packbits(queries > 0, axis=1)):
+            scores[i] = self.dim - 2 * POPCOUNT[np.bitwise_xor(codes, bits)].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def candidates_batch(self, queries, k, live=None):
+        """candidates() for a block of unit-length queries, reading the codes once."""
+        k = min(k, len(self))
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BATCH_SIZE):
+            end = min(start + SCORE_BATCH_SIZE, len(self))
+            scores = self._score_block(queries, start, end)
+            if live is not None:
+                scores[:, ~live[start:end]] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        return [rows[scores > -np.inf] for rows, scores in zip(best_rows, best_scores)]
+
+    def candidates(self, query, k, live=None, rows=None):
+        """Row ids of the k best rows by approximate score, skipping dead rows; unordered."""
+        scores = self.scores(query, rows)
+        if rows is None and live is not None:
+            scores[~live] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+        top = top[scores[top] > -np.inf]
+        return top if rows is None else rows[top]
+
+
+def load_quantized(store, config):
+    """Codes for `store` if quantization is configured and they are current, else None."""
+    kind = quantization_type(config)
+    if kind is None or store is None or len(store) == 0:
+        return None
+    info = store.info.get("quantized")
+    if not info or info["kind"] != kind or info["rows"] != len(store):
+        logger.warning(f"No current {kind} codes for index v{store.version}; scoring full-precision vectors "
+                       "(a full reindex builds them)")
+        return None
+    return QuantizedVectors(store)
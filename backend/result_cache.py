@@ -0,0 +1,62 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from backend.metadata import active_filters
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query; queries that normalize alike share results."""
+    return _SPACE_RE.sub(" ", query).strip().casefold()
+
+
+def filters_key(filters):
+    """Hashable form of the filters that constrain anything."""
+    return tuple((key, tuple(value) if isinstance(value, list) else value)
+                 for key, value in sorted(active_filters(filters).items()))
+
+
+class ResultCache:
+    """Bounded LRU of ranked search results with a time-to-live.
+
+    Keys include the index version, so entries for an index that has been
+    replaced are never served; SearchEngine also clears the cache when it loads
+    a new index so they don't hold memory until they age out.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored, value = entry
+            if self.ttl and time.monotonic() - stored > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,14 +1,17 @@
 import os
 import re
-import json
 import numpy as np
 import unicodedata
-from concurrent.futures import ThreadPoolExecutor
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Optional, Generator
+from typing import List, Dict, Optional, Tuple
 import logging
-import faiss
-import mmap
+
+from backend.ann import ann_candidates, ann_candidates_batch, load_ann_index
+from backend.dedup import collapse
+from backend.inverted_index import LexicalIndex, PathIndex, load_lexical_index, tokenize
+from backend.metadata import FileMetadata, active_filters
+from backend.quantization import QuantizedVectors, load_quantized
+from backend.storage import StoredIndex, load_index
+from backend import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -53,144 +56,430 @@ def highlight_match(text: str, query: str, window: int = 400) -> str:
         logger.error(f"Error highlighting match: {e}")
         return normalized_text[:window] + ("..." if len(normalized_text) > window else "")
 
-def stream_file_chunks(file_path: str, chunk_size: int = 1024) -> Generator[str, None, None]:
-    """Stream large file in chunks to avoid loading into memory."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-                for i in range(0, len(mm), chunk_size):
-                    yield mm[i:i + chunk_size].decode('utf-8', errors='ignore')
-    except Exception as e:
-        logger.error(f"Error streaming file {file_path}: {e}")
-        yield ""
+KEYWORD_BOOST = 0.1
+# Hits ranked per result when near-duplicates are collapsed.
+COLLAPSE_OVERFETCH = 3
+# Placeholder embedMatch entry when a search finds nothing above min_score.
+NO_MATCH = {"filename": "", "text": "No good match found.", "score": -1.0}
+# Upper bound on chunks whose text is checked for the keyword boost per query.
+BOOST_CANDIDATE_LIMIT = 10000
+SCORE_BATCH_SIZE = 65536
+# Queries scored together per pass over the store in batch search; bounds the
+# (SCORE_BATCH_SIZE x QUERY_BATCH_SIZE) score block.
+QUERY_BATCH_SIZE = 256
+# Filtered queries whose scope is at most this fraction of the live rows are scored
+# exactly over just those rows; wider scopes go through the ANN index's ID selector.
+FILTER_EXACT_FRACTION = 0.05
 
-def load_embeddings_in_batches(index_path: str, batch_size: int = 1000) -> Generator[tuple[np.ndarray, List[Dict]], None, None]:
-    """Load embeddings in batches to reduce memory usage."""
-    try:
-        with open(index_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i + batch_size]
-            embeddings = np.array([item['embedding'] for item in batch if 'embedding' in item], dtype=np.float32)
-            if embeddings.size > 0:
-                yield embeddings, batch
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON in {index_path}: {e}")
-        yield np.array([]), []
-    except Exception as e:
-        logger.error(f"Error loading embeddings from {index_path}: {e}")
-        yield np.array([]), []
+def inverse_norms(store: StoredIndex, batch_size: int = SCORE_BATCH_SIZE) -> Optional[np.ndarray]:
+    """Per-row 1/||v|| for stores written without unit-length vectors, else None."""
+    if store.info.get("normalized"):
+        return None
+    inv = np.empty(len(store), dtype=np.float32)
+    for i in range(0, len(store), batch_size):
+        norms = np.linalg.norm(np.asarray(store.vectors[i:i + batch_size], dtype=np.float32), axis=1)
+        inv[i:i + batch_size] = 1.0 / np.maximum(norms, 1e-12)
+    return inv
 
-def build_faiss_index(embeddings: np.ndarray) -> faiss.IndexFlatL2:
-    """Build a FAISS index for faster similarity search."""
-    try:
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
-        return index
-    except Exception as e:
-        logger.error(f"Error building FAISS index: {e}")
+def cosine_scores(store: StoredIndex, query_embedding: np.ndarray, inv_norms: Optional[np.ndarray] = None,
+                  batch_size: int = SCORE_BATCH_SIZE) -> np.ndarray:
+    """Cosine similarity of the query against every stored vector, one matmul per slice."""
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = np.empty(len(store), dtype=np.float32)
+    for i in range(0, len(store), batch_size):
+        scores[i:i + batch_size] = np.asarray(store.vectors[i:i + batch_size], dtype=np.float32) @ query
+    if inv_norms is not None:
+        scores *= inv_norms
+    if store.live is not None:
+        scores[~store.live] = -np.inf
+    return scores
+
+def subset_cosine_scores(store: StoredIndex, query_embedding: np.ndarray, rows: np.ndarray,
+                         inv_norms: Optional[np.ndarray] = None, batch_size: int = SCORE_BATCH_SIZE) -> np.ndarray:
+    """Cosine similarity of the query against the given (live) rows only."""
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = np.empty(len(rows), dtype=np.float32)
+    for i in range(0, len(rows), batch_size):
+        scores[i:i + batch_size] = np.asarray(store.vectors[rows[i:i + batch_size]], dtype=np.float32) @ query
+    if inv_norms is not None:
+        scores *= inv_norms[rows]
+    return scores
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(scores, -k)[-k:]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(scores[top])[::-1]]
+
+def keyword_mask(store: StoredIndex, indices: np.ndarray, query_lower: str,
+                 keyword_rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """True where the chunk contains the query.
+
+    With `keyword_rows` (rows holding every query token, from the postings) this is a
+    lookup; otherwise the candidates' text is scanned for the whole query string.
+    """
+    if keyword_rows is not None:
+        return np.isin(indices, keyword_rows)
+    return np.fromiter(
+        (query_lower in normalize_text(store.text(int(i))).lower() for i in indices),
+        dtype=bool, count=len(indices)
+    )
+
+def _select_top_k(store: StoredIndex, candidates: np.ndarray, scores: np.ndarray, query_lower: str,
+                  top_k: int, min_score: float, keyword_rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """Apply the keyword boost to candidate rows and keep the best k above min_score."""
+    if query_lower and len(candidates):
+        scores = scores + KEYWORD_BOOST * keyword_mask(store, candidates, query_lower, keyword_rows)
+    order = top_k_indices(scores, top_k)
+    candidates, scores = candidates[order], scores[order]
+    keep = scores >= min_score
+    return [(int(i), float(s)) for i, s in zip(candidates[keep], scores[keep])]
+
+def rank_chunks(store: StoredIndex, query_embedding: np.ndarray, query_lower: str, top_k: int,
+                min_score: float, inv_norms: Optional[np.ndarray] = None,
+                keyword_rows: Optional[np.ndarray] = None, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """Top-k (row, score) pairs by exact cosine similarity plus the keyword boost.
+
+    `rows` (sorted, from a metadata filter) limits scoring to those rows.
+    """
+    if store.live_count == 0 or (rows is not None and not len(rows)):
+        return []
+    if rows is None:
+        scores = cosine_scores(store, query_embedding, inv_norms)
+        row_ids = lambda positions: positions
+    else:
+        scores = subset_cosine_scores(store, query_embedding, rows, inv_norms)
+        row_ids = lambda positions: rows[positions]
+        if keyword_rows is not None:
+            keyword_rows = np.flatnonzero(np.isin(rows, keyword_rows, assume_unique=True))
+    if keyword_rows is not None:
+        scores[keyword_rows] += KEYWORD_BOOST
+        candidates = top_k_indices(scores, top_k)
+        return _select_top_k(store, row_ids(candidates), scores[candidates], "", top_k, min_score)
+    candidates = top_k_indices(scores, top_k)
+    if query_lower:
+        # Only chunks within KEYWORD_BOOST of the k-th base score can be lifted into the top k.
+        threshold = scores[candidates[-1]] - KEYWORD_BOOST
+        candidates = np.flatnonzero(scores >= threshold)
+        if len(candidates) > BOOST_CANDIDATE_LIMIT:
+            candidates = candidates[top_k_indices(scores[candidates], BOOST_CANDIDATE_LIMIT)]
+    return _select_top_k(store, row_ids(candidates), scores[candidates], query_lower, top_k, min_score)
+
+def rank_chunks_ann(store: StoredIndex, ann_index, query_embedding: np.ndarray, query_lower: str, top_k: int,
+                    min_score: float, inv_norms: Optional[np.ndarray] = None,
+                    num_candidates: int = 100, keyword_rows: Optional[np.ndarray] = None,
+                    allowed: Optional[np.ndarray] = None) -> Optional[List[Tuple[int, float]]]:
+    """Like rank_chunks, but candidates come from the ANN index and are rescored exactly.
+
+    `allowed` (a row mask from a metadata filter) is applied inside the ANN search.
+    Returns None when a filtered graph search comes back short of top_k, so the
+    caller can score the filtered rows exactly instead of dropping hits.
+    """
+    if store.live_count == 0:
+        return []
+    candidates = ann_candidates(ann_index, query_embedding, max(num_candidates, top_k), store.live, allowed)
+    if allowed is not None and len(candidates) < min(top_k, int(allowed.sum())):
         return None
+    scores = _rescore(store, candidates, query_embedding, inv_norms)
+    return _select_top_k(store, candidates, scores, query_lower, top_k, min_score, keyword_rows)
+
+def rank_chunks_quantized(store: StoredIndex, quantized: QuantizedVectors, query_embedding: np.ndarray,
+                          query_lower: str, top_k: int, min_score: float, inv_norms: Optional[np.ndarray] = None,
+                          num_candidates: int = 200, keyword_rows: Optional[np.ndarray] = None,
+                          rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    """Like rank_chunks, but the first pass scores the int8/binary codes and only the
+    best `num_candidates` rows are rescored against the full-precision vectors."""
+    if store.live_count == 0 or (rows is not None and not len(rows)):
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    candidates = np.sort(quantized.candidates(query, max(num_candidates, top_k), store.live, rows))
+    scores = _rescore(store, candidates, query, inv_norms)
+    return _select_top_k(store, candidates, scores, query_lower, top_k, min_score, keyword_rows)
+
+def _rescore(store: StoredIndex, candidates: np.ndarray, query_embedding: np.ndarray,
+             inv_norms: Optional[np.ndarray] = None) -> np.ndarray:
+    """Exact cosine scores of candidate rows against the full-precision vectors."""
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = np.asarray(store.vectors[candidates], dtype=np.float32) @ query
+    if inv_norms is not None:
+        scores *= inv_norms[candidates]
+    return scores
+
+def _normalized_queries(query_embeddings: np.ndarray) -> np.ndarray:
+    queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+    return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+def batch_top_k(store: StoredIndex, query_embeddings: np.ndarray, k: int, inv_norms: Optional[np.ndarray] = None,
+                batch_size: int = SCORE_BATCH_SIZE) -> List[List[Tuple[int, float]]]:
+    """Exact top-k (row, cosine) pairs for many queries, best first.
+
+    Each slice of the store is read once per QUERY_BATCH_SIZE queries and scored
+    with one matrix-matrix product; a running top-k per query is kept between
+    slices so no (queries x rows) score matrix is ever materialized.
+    """
+    queries = _normalized_queries(query_embeddings)
+    k = min(k, store.live_count)
+    if k <= 0:
+        return [[] for _ in queries]
+    results = []
+    for q_start in range(0, len(queries), QUERY_BATCH_SIZE):
+        block = queries[q_start:q_start + QUERY_BATCH_SIZE]
+        best_rows = np.empty((len(block), 0), dtype=np.int64)
+        best_scores = np.empty((len(block), 0), dtype=np.float32)
+        for i in range(0, len(store), batch_size):
+            scores = block @ np.asarray(store.vectors[i:i + batch_size], dtype=np.float32).T
+            if inv_norms is not None:
+                scores *= inv_norms[i:i + batch_size]
+            if store.live is not None:
+                scores[:, ~store.live[i:i + batch_size]] = -np.inf
+            rows = np.broadcast_to(np.arange(i, i + scores.shape[1]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        results.extend([(int(r), float(s)) for r, s in zip(rows, scores) if s > -np.inf]
+                       for rows, scores in zip(best_rows, best_scores))
+    return results
+
+def batch_top_k_ann(store: StoredIndex, ann_index, query_embeddings: np.ndarray, k: int,
+                    inv_norms: Optional[np.ndarray] = None, num_candidates: int = 100) -> List[List[Tuple[int, float]]]:
+    """batch_top_k with candidates from one batched ANN search, rescored exactly."""
+    queries = _normalized_queries(query_embeddings)
+    results = []
+    for query, candidates in zip(queries, ann_candidates_batch(ann_index, queries, max(num_candidates, k), store.live)):
+        scores = _rescore(store, candidates, query, inv_norms)
+        order = top_k_indices(scores, k)
+        results.append([(int(candidates[i]), float(scores[i])) for i in order])
+    return results
+
+def batch_top_k_quantized(store: StoredIndex, quantized: QuantizedVectors, query_embeddings: np.ndarray, k: int,
+                          inv_norms: Optional[np.ndarray] = None,
+                          num_candidates: int = 200) -> List[List[Tuple[int, float]]]:
+    """batch_top_k with a first pass over the compressed codes, rescored exactly."""
+    queries = _normalized_queries(query_embeddings)
+    results = []
+    for q_start in range(0, len(queries), QUERY_BATCH_SIZE):
+        block = queries[q_start:q_start + QUERY_BATCH_SIZE]
+        for query, candidates in zip(block, quantized.candidates_batch(block, max(num_candidates, k), store.live)):
+            candidates = np.sort(candidates)
+            scores = _rescore(store, candidates, query, inv_norms)
+            order = top_k_indices(scores, k)
+            results.append([(int(candidates[i]), float(scores[i])) for i in order])
+    return results
+
+def fuse_rrf(vector_hits: List[Tuple[int, float]], lexical_hits: List[Tuple[int, float]], k: int = 60,
+             vector_weight: float = 1.0, lexical_weight: float = 1.0) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion: each list contributes weight / (k + rank) per row."""
+    fused = {}
+    for hits, weight in ((vector_hits, vector_weight), (lexical_hits, lexical_weight)):
+        for rank, (row, _) in enumerate(hits, start=1):
+            fused[row] = fused.get(row, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)
+
+def fuse_weighted(vector_hits: List[Tuple[int, float]], lexical_hits: List[Tuple[int, float]],
+                  vector_weight: float = 1.0, lexical_weight: float = 1.0) -> List[Tuple[int, float]]:
+    """Weighted sum of scores, each list scaled by its best score so BM25 and cosine are comparable."""
+    fused = {}
+    for hits, weight in ((vector_hits, vector_weight), (lexical_hits, lexical_weight)):
+        top = max((score for _, score in hits), default=0.0)
+        if top <= 0:
+            continue
+        for row, score in hits:
+            fused[row] = fused.get(row, 0.0) + weight * max(score, 0.0) / top
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)
 
-def search(query_embedding: np.ndarray, config: Dict, query: str = "", top_k: int = 5) -> Dict:
-    """Search files and embeddings for query matches with hybrid scoring."""
+def hybrid_rank(store: StoredIndex, lexicon: LexicalIndex, query_embedding: np.ndarray, query: str,
+                top_k: int, min_score: float, config: Dict, ann_index=None,
+                inv_norms: Optional[np.ndarray] = None,
+                vector_hits: Optional[List[Tuple[int, float]]] = None, rows: Optional[np.ndarray] = None,
+                allowed: Optional[np.ndarray] = None,
+                quantized: Optional[QuantizedVectors] = None) -> List[Tuple[int, float]]:
+    """Top-k (row, fused score) pairs from the vector and BM25 candidate lists.
+
+    Each retriever contributes at most vector_candidates / lexical_candidates rows,
+    so fusion only touches a few hundred rows whatever the size of the index.
+    min_score applies to the vector side; rows found only by BM25 (exact identifiers
+    the embedding misses) are kept on the strength of their term match.
+    `vector_hits` are precomputed cosine hits (from batch search), best first.
+    `rows`/`allowed` restrict both retrievers to a metadata-filtered scope.
+    """
+    num_vector = max(config.get("vector_candidates", 50), top_k)
+    if vector_hits is not None:
+        vector_hits = [hit for hit in vector_hits[:num_vector] if hit[1] >= min_score]
+    elif ann_index is not None:
+        try:
+            vector_hits = rank_chunks_ann(store, ann_index, query_embedding, "", num_vector, min_score, inv_norms,
+                                          max(config.get("ann_candidates", 100), num_vector), allowed=allowed)
+        except Exception as e:
+            logger.error(f"ANN search failed, falling back to exact search: {e}")
+    if vector_hits is None and quantized is not None:
+        vector_hits = rank_chunks_quantized(store, quantized, query_embedding, "", num_vector, min_score, inv_norms,
+                                            max(config.get("rescore_candidates", 200), num_vector), rows=rows)
+    if vector_hits is None:
+        vector_hits = rank_chunks(store, query_embedding, "", num_vector, min_score, inv_norms, rows=rows)
+    lexical_hits = lexicon.bm25(tokenize(query), max(config.get("lexical_candidates", 50), top_k),
+                                config.get("bm25_k1", 1.2), config.get("bm25_b", 0.75), allowed)
+
+    vector_weight, lexical_weight = config.get("vector_weight", 1.0), config.get("lexical_weight", 1.0)
+    if config.get("fusion") == "weighted":
+        fused = fuse_weighted(vector_hits, lexical_hits, vector_weight, lexical_weight)
+    else:
+        fused = fuse_rrf(vector_hits, lexical_hits, config.get("rrf_k", 60), vector_weight, lexical_weight)
+    return fused[:top_k]
+
+def duplicate_locations(store: StoredIndex, row: int, folded_rows) -> List[str]:
+    """Other files holding this chunk: byte-identical copies of its file, and files of collapsed near-duplicates."""
+    filename = store.filename(row)
+    locations = list(store.duplicates.get(filename, ()))
+    for other in folded_rows:
+        other_file = store.filename(other)
+        locations.append(other_file)
+        locations.extend(store.duplicates.get(other_file, ()))
+    return [path for path in dict.fromkeys(locations) if path != filename]
+
+def rank_depth(store: StoredIndex, top_k: int, config: Dict) -> int:
+    """Hits search() ranks for `top_k` results: more when near-duplicates will be collapsed."""
+    if config.get("collapse_duplicates", True) and store.signatures is not None:
+        return top_k * COLLAPSE_OVERFETCH
+    return top_k
+
+def search(query_embedding: np.ndarray, config: Dict, query: str = "", top_k: int = 5,
+           store: Optional[StoredIndex] = None, ann_index=None,
+           inv_norms: Optional[np.ndarray] = None, lexicon: Optional[LexicalIndex] = None,
+           path_index: Optional[PathIndex] = None, min_score: Optional[float] = None,
+           vector_hits: Optional[List[Tuple[int, float]]] = None, filters: Optional[Dict] = None,
+           metadata: Optional[FileMetadata] = None, quantized: Optional[QuantizedVectors] = None) -> Dict:
+    """Search files and embeddings for query matches with hybrid scoring.
+
+    `store`, `ann_index`, `inv_norms`, `lexicon`, `path_index`, `metadata` and
+    `quantized` are normally supplied by a long-lived SearchEngine; when omitted the index is
+    opened for this call only. `min_score` overrides the configured threshold, and
+    `vector_hits` (from batch_top_k) replaces the per-query vector scan.
+
+    `filters` (type, path_prefix, modified_after/before as epoch seconds,
+    min/max_size in bytes) select the files in scope before anything is scored.
+    """
     try:
-        index_path = os.path.join(config['index_folder'], 'embeddings.json')
-        min_score = config.get("min_score", 0.05)  # Lowered threshold
+        if store is None:
+            store = load_index(config)
+            if store is not None:
+                inv_norms = inverse_norms(store)
+                ann_index = load_ann_index(store, config)
+                lexicon = load_lexical_index(store)
+                quantized = load_quantized(store, config)
+        if store is None:
+            return {
+                "fileMatch": [],
+                "embedMatch": [{"filename": "", "text": "No embeddings found. Please run indexing.", "score": -1.0}]
+            }
+        if min_score is None:
+            min_score = config.get("min_score", 0.05)  # Lowered threshold
         query_lower = query.lower()
         results = []
         file_matches = []
-        seen_files = set()
 
-        # File name-based search
-        try:
-            with open(index_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            for item in data:
-                path = item.get('filename', '')
-                if not path:
-                    continue
-                relative_path = os.path.relpath(path, config["source_folder"])
-                if query_lower in relative_path.lower() or query_lower in os.path.basename(path).lower():
-                    if path not in seen_files:
-                        abs_path = os.path.abspath(path)
-                        file_matches.append({
-                            "filename": abs_path,
-                            "folder": os.path.dirname(abs_path)
-                        })
-                        seen_files.add(path)
-        except Exception as e:
-            logger.error(f"Error in file name search: {e}")
+        # Metadata filters, resolved to the rows of matching files
+        filters = active_filters(filters)
+        rows = allowed = in_scope = None
+        if filters:
+            with metrics.span("filter"):
+                if metadata is None:
+                    metadata = FileMetadata(store, config["source_folder"])
+                file_mask = metadata.select_files(filters)
+                in_scope = {store.paths[i] for i in np.flatnonzero(file_mask)}
+                rows = metadata.select_rows(filters)
+                allowed = metadata.row_mask(rows)
+                vector_hits = None
+                if len(rows) <= FILTER_EXACT_FRACTION * store.live_count:
+                    # Narrow scope: scoring just these rows is exact and cheaper than the ANN index.
+                    ann_index = None
 
-        # Embedding-based search with keyword boosting
-        use_faiss = config.get("use_faiss", False)
-        if use_faiss:
+        # File name-based search
+        with metrics.span("path_match"):
             try:
-                embeddings, data = next(load_embeddings_in_batches(index_path, batch_size=10000))
-                if embeddings.size == 0:
-                    return {
-                        "fileMatch": file_matches,
-                        "embedMatch": [{"filename": "", "text": "No embeddings found. Please run indexing.", "score": -1.0}]
-                    }
-                index = build_faiss_index(embeddings)
-                if index:
-                    distances, indices = index.search(np.array([query_embedding], dtype=np.float32), top_k)
-                    for idx, distance in zip(indices[0], distances[0]):
-                        score = 1 / (1 + distance)
-                        item = data[idx]
-                        # Keyword boost: +0.1 if query appears in text
-                        keyword_boost = 0.1 if query_lower in normalize_text(item["text"]).lower() else 0
-                        score += keyword_boost
-                        logger.info(f"FAISS score for {item['filename']}: {score} (base: {1/(1+distance)}, boost: {keyword_boost})")
-                        if score < min_score:
-                            continue
-                        results.append({
-                            "filename": item["filename"],
-                            "chunk_id": item.get("chunk_id", -1),
-                            "text": item["text"],
-                            "highlighted": highlight_match(item["text"], query),
-                            "score": round(float(score), 4)
-                        })
+                if path_index is None:
+                    path_index = PathIndex(store.files, config["source_folder"])
+                for path in path_index.match(query_lower):
+                    if in_scope is not None and path not in in_scope:
+                        continue
+                    abs_path = os.path.abspath(path)
+                    file_matches.append({
+                        "filename": abs_path,
+                        "folder": os.path.dirname(abs_path)
+                    })
             except Exception as e:
-                logger.error(f"FAISS search failed, falling back to cosine similarity: {e}")
-                use_faiss = False
+                logger.error(f"Error in file name search: {e}")
+
+        # Near-duplicate chunks are folded into the best of them, so rank extra to still fill top_k.
+        signatures = store.signatures if config.get("collapse_duplicates", True) else None
+        rank_k = rank_depth(store, top_k, config)
+
+        with metrics.span("score"):
+            hits = None
+            keyword_rows = None
+            if config.get("fusion", "rrf") != "none" and lexicon is not None and query_lower:
+                # Vector and BM25 candidates fused by rank or weighted score
+                hits = hybrid_rank(store, lexicon, query_embedding, query, rank_k, min_score, config,
+                                   ann_index, inv_norms, vector_hits, rows, allowed, quantized)
+            elif lexicon is not None and query_lower:
+                # Rows containing every query token, looked up once for the keyword boost
+                keyword_rows = lexicon.rows_with_all(tokenize(query))
 
-        if not use_faiss:
-            def score_item(item: Dict, idx: int) -> Optional[Dict]:
+            # Embedding-based search with keyword boosting
+            if hits is None and vector_hits is not None:
+                candidates = np.array([row for row, _ in vector_hits], dtype=np.int64)
+                scores = np.array([score for _, score in vector_hits], dtype=np.float32)
+                hits = _select_top_k(store, candidates, scores, query_lower, rank_k, min_score, keyword_rows)
+            if hits is None and ann_index is not None:
                 try:
-                    score = float(cosine_similarity([query_embedding], [item["embedding"]])[0][0])
-                    # Keyword boost: +0.1 if query appears in text
-                    keyword_boost = 0.1 if query_lower in normalize_text(item["text"]).lower() else 0
-                    score += keyword_boost
-                    logger.info(f"Cosine score for {item['filename']}: {score} (base: {score-keyword_boost}, boost: {keyword_boost})")
-                    if score < min_score:
-                        return None
-                    return {
-                        "filename": item["filename"],
-                        "chunk_id": item.get("chunk_id", -1),
-                        "text": item["text"],
-                        "highlighted": highlight_match(item["text"], query),
-                        "score": round(score, 4)
-                    }
+                    hits = rank_chunks_ann(store, ann_index, query_embedding, query_lower, rank_k, min_score,
+                                           inv_norms, config.get("ann_candidates", 100), keyword_rows, allowed)
                 except Exception as e:
-                    logger.error(f"Error scoring item {idx}: {e}")
-                    return None
+                    logger.error(f"ANN search failed, falling back to exact search: {e}")
+            if hits is None and quantized is not None:
+                hits = rank_chunks_quantized(store, quantized, query_embedding, query_lower, rank_k, min_score, inv_norms,
+                                             config.get("rescore_candidates", 200), keyword_rows, rows)
+            if hits is None:
+                hits = rank_chunks(store, query_embedding, query_lower, rank_k, min_score, inv_norms, keyword_rows, rows)
 
-            with ThreadPoolExecutor() as executor:
-                for embeddings, batch_data in load_embeddings_in_batches(index_path):
-                    if embeddings.size == 0:
-                        continue
-                    scores = cosine_similarity([query_embedding], embeddings)[0]
-                    futures = [executor.submit(score_item, batch_data[i], i) for i in range(len(batch_data))]
-                    for future in futures:
-                        res = future.result()
-                        if res:
-                            results.append(res)
+        folded = {}
+        if signatures is not None:
+            with metrics.span("collapse"):
+                hits, folded = collapse(hits, signatures, config.get("near_duplicate_distance", 8))
+                hits = hits[:top_k]
+
+        with metrics.span("highlight"):
+            for idx, score in hits:
+                item = store.record(idx)
+                results.append({
+                    "filename": item["filename"],
+                    "chunk_id": item["chunk_id"],
+                    "page": item["page"],
+                    "text": item["text"],
+                    "highlighted": highlight_match(item["text"], query),
+                    "score": round(score, 6),
+                    "duplicates": duplicate_locations(store, idx, folded.get(idx, ()))
+                })
 
         results = sorted(results, key=lambda x: x["score"], reverse=True)[:top_k]
         return {
             "fileMatch": file_matches,
-            "embedMatch": results or [{"filename": "", "text": "No good match found.", "score": -1.0}]
+            "embedMatch": results or [dict(NO_MATCH)]
         }
     except Exception as e:
         logger.error(f"Search failed: {e}")
@@ -199,23 +488,57 @@ def search(query_embedding: np.ndarray, config: Dict, query: str = "", top_k: in
             "embedMatch": [{"filename": "", "text": f"Search error: {str(e)}", "score": -1.0}]
         }
 
-def index_large_file(file_path: str, index_path: str, embedding_model, chunk_size: int = 1024):
-    """Index large files by streaming chunks and generating embeddings."""
-    try:
-        data = []
-        chunk_id = 0
-        for chunk in stream_file_chunks(file_path, chunk_size):
-            if not chunk:
-                continue
-            embedding = embedding_model.encode([chunk])[0]
-            data.append({
-                "filename": file_path,
-                "chunk_id": chunk_id,
-                "text": chunk,
-                "embedding": embedding.tolist()
-            })
-            chunk_id += 1
-        with open(index_path, 'a', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        logger.error(f"Error indexing file {file_path}: {e}")
\ No newline at end of file
+def search_batch(query_embeddings: np.ndarray, config: Dict, queries: List[Dict],
+                 store: Optional[StoredIndex] = None, ann_index=None, inv_norms: Optional[np.ndarray] = None,
+                 lexicon: Optional[LexicalIndex] = None, path_index: Optional[PathIndex] = None,
+                 metadata: Optional[FileMetadata] = None,
+                 quantized: Optional[QuantizedVectors] = None) -> List[Dict]:
+    """search() for many queries at once; one result dict per entry of `queries`.
+
+    `queries` are dicts with "q" and optionally "top_k", "min_score" and "filters".
+    Vector candidates for the unfiltered ones come from a single pass over the
+    store (or one batched ANN call); filtered queries are scored over their own
+    scope. Fusion and result assembly then run per query.
+    """
+    if store is None:
+        store = load_index(config)
+        if store is not None:
+            inv_norms = inverse_norms(store)
+            ann_index = load_ann_index(store, config)
+            lexicon = load_lexical_index(store)
+            quantized = load_quantized(store, config)
+    if store is None or not queries:
+        return [search(None, config, item["q"], store=store) for item in queries]
+    if path_index is None:
+        path_index = PathIndex(store.files, config["source_folder"])
+
+    all_hits = [None] * len(queries)
+    unfiltered = [i for i, item in enumerate(queries) if not active_filters(item.get("filters"))]
+    if unfiltered:
+        embeddings = np.asarray(query_embeddings)[unfiltered]
+        # Enough candidates for the largest top_k (before collapse), fusion, and the keyword boost to reorder.
+        k = max(max(rank_depth(store, queries[i].get("top_k") or 5, config) for i in unfiltered),
+                config.get("vector_candidates", 50))
+        with metrics.span("batch_score"):
+            batch_hits = None
+            if ann_index is not None:
+                try:
+                    batch_hits = batch_top_k_ann(store, ann_index, embeddings, k, inv_norms,
+                                                 config.get("ann_candidates", 100))
+                except Exception as e:
+                    logger.error(f"ANN search failed, falling back to exact search: {e}")
+            if batch_hits is None and quantized is not None:
+                batch_hits = batch_top_k_quantized(store, quantized, embeddings, k, inv_norms,
+                                                   config.get("rescore_candidates", 200))
+            if batch_hits is None:
+                batch_hits = batch_top_k(store, embeddings, k, inv_norms)
+        for i, hits in zip(unfiltered, batch_hits):
+            all_hits[i] = hits
+
+    return [
+        search(embedding, config, query=item["q"], top_k=item.get("top_k") or 5, store=store,
+               ann_index=ann_index, inv_norms=inv_norms, lexicon=lexicon, path_index=path_index,
+               min_score=item.get("min_score"), vector_hits=hits, filters=item.get("filters"),
+               metadata=metadata, quantized=quantized)
+        for embedding, item, hits in zip(query_embeddings, queries, all_hits)
+    ]
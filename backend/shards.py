@@ -0,0 +1,134 @@
+"""Scatter-gather vector scoring over processes that each own a shard of the files.
+
+Files are assigned to shards by crc32 of their path, so a file stays in the same
+shard across reindexes. Every shard process maps the same published segment
+read-only (the OS keeps one copy of it in the page cache however many processes
+read it) and scores only its own rows; the API process merges their top-k lists
+and runs fusion, highlighting and the rest of search() as usual.
+"""
+import multiprocessing
+import threading
+import zlib
+
+import numpy as np
+
+from backend.logger import get_logger, set_debug
+from backend.metadata import FileMetadata
+from backend.quantization import load_quantized
+from backend.search import inverse_norms, rank_chunks, rank_chunks_quantized
+from backend.storage import load_index
+
+logger = get_logger()
+
+
+def shard_of(path, count):
+    return zlib.crc32(path.encode("utf-8")) % count
+
+
+class _Shard:
+    """One shard's view of a published index: the rows of its files, plus what scoring them needs."""
+
+    def __init__(self, config, shard, count):
+        self.config = config
+        self.store = load_index(config)
+        self.version = self.store.version if self.store is not None else None
+        if self.store is None:
+            return
+        metadata = FileMetadata(self.store, config["source_folder"])
+        mine = np.array([shard_of(path, count) == shard for path in self.store.paths], dtype=bool)
+        self.rows = metadata.rows_of(metadata.live & mine)
+        self.inv_norms = inverse_norms(self.store)
+        self.quantized = load_quantized(self.store, config)
+
+    def top_k(self, query_embedding, k):
+        if self.quantized is not None:
+            return rank_chunks_quantized(self.store, self.quantized, query_embedding, "", k, -np.inf, self.inv_norms,
+                                         max(self.config.get("rescore_candidates", 200), k), rows=self.rows)
+        return rank_chunks(self.store, query_embedding, "", k, -np.inf, self.inv_norms, rows=self.rows)
+
+
+def _serve_shard(config, shard, count, conn):
+    """Shard process loop: answer (index version, query embedding, k) requests until told to stop."""
+    set_debug(config.get("debug_logging", False))
+    state = None
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        version, query_embedding, k = request
+        try:
+            if state is None or state.version != version:
+                state = _Shard(config, shard, count)
+            # Still not the coordinator's version (a reindex is being published): let it score locally.
+            conn.send(state.top_k(query_embedding, k) if state.version == version else None)
+        except Exception as e:
+            logger.error(f"Search shard {shard} failed: {e}")
+            conn.send(None)
+
+
+class ShardPool:
+    """`count` long-lived shard processes, queried together.
+
+    Queries from concurrent requests take turns; each one already keeps every
+    shard (and so every core given to the pool) busy.
+    """
+
+    def __init__(self, config, count):
+        context = multiprocessing.get_context("spawn")
+        self.count = count
+        self._lock = threading.Lock()
+        self._shards = []
+        for shard in range(count):
+            conn, child = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(config, shard, count, child),
+                                      name=f"search-shard-{shard}", daemon=True)
+            process.start()
+            child.close()
+            self._shards.append((process, conn))
+        logger.info(f"Started {count} search shard processes")
+
+    def top_k(self, version, query_embedding, k):
+        """Best k (row, cosine score) pairs over all shards of index `version`, best first.
+
+        None when any shard cannot answer for that version; the caller then scores
+        in its own process.
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        with self._lock:
+            if not self._shards:
+                return None
+            try:
+                for _, conn in self._shards:
+                    conn.send((version, query_embedding, k))
+                replies = [conn.recv() for _, conn in self._shards]
+            except (EOFError, OSError) as e:
+                # A shard process died; the others may hold unread replies, so stop using the pool.
+                logger.error(f"Search shards unavailable, scoring in-process from now on: {e}")
+                self._stop()
+                return None
+        if any(reply is None for reply in replies):
+            return None
+        hits = [hit for reply in replies for hit in reply]
+        # Row order breaks ties so results don't depend on which shard answered first.
+        hits.sort(key=lambda hit: (-hit[1], hit[0]))
+        return hits[:k]
+
+    def _stop(self):
+        for process, conn in self._shards:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for process, _ in self._shards:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._shards = []
+
+    def close(self):
+        with self._lock:
+            self._stop()
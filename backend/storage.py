@@ -1,7 +1,488 @@
 import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from functools import cached_property
 from pathlib import Path
 
-def save_index(embeddings, config):
-    Path(config['index_folder']).mkdir(parents=True, exist_ok=True)
-    with open(Path(config['index_folder']) / 'embeddings.json', 'w') as f:
-        json.dump(embeddings, f, indent=2)
+import numpy as np
+
+from backend.logger import get_logger
+
+logger = get_logger()
+
+INDEX_FILE = "index.json"
+LEGACY_INDEX_FILE = "embeddings.json"
+LOCK_FILE = "index.lock"
+FORMAT_VERSION = 3
+
+# One fixed-size row per chunk; the text itself lives in the segment's .texts file.
+# page is the 1-based page the chunk starts on, 0 for sources without pages.
+CHUNK_DTYPE = np.dtype([
+    ("file_id", "<i4"),
+    ("chunk_id", "<i4"),
+    ("text_offset", "<i8"),
+    ("text_length", "<i4"),
+    ("page", "<i4"),
+])
+# Formats 1 and 2 had no page column; they are still readable, and rebuilt on the next indexing run.
+LEGACY_CHUNK_DTYPE = np.dtype([
+    ("file_id", "<i4"),
+    ("chunk_id", "<i4"),
+    ("text_offset", "<i8"),
+    ("text_length", "<i4"),
+])
+
+
+def chunk_dtype(info):
+    return CHUNK_DTYPE if info.get("format", 1) >= 3 else LEGACY_CHUNK_DTYPE
+
+VECTOR_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def _segment_paths(folder, segment):
+    folder = Path(folder)
+    return {
+        "vectors": folder / f"{segment}.vectors",
+        "chunks": folder / f"{segment}.chunks",
+        "texts": folder / f"{segment}.texts",
+    }
+
+
+def _write_json_atomic(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_index_info(index_folder):
+    """Return the published index.json contents, or None when there is no binary index."""
+    path = Path(index_folder) / INDEX_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def index_mtime(config):
+    """mtime of index.json, used by readers to notice a newly published index."""
+    try:
+        return os.stat(Path(config["index_folder"]) / INDEX_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class IndexLocked(RuntimeError):
+    pass
+
+
+def lock_file(path, wait=False):
+    """Open `path` and take an exclusive OS lock on it; returns the open file for unlock_file().
+
+    Raises OSError if the lock is held (by another process, or another open of
+    the file) and `wait` is false. The OS drops the lock if the holder dies.
+    """
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                f.seek(0)
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not wait:
+                        raise
+                    time.sleep(0.5)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise
+    return f
+
+
+def unlock_file(f):
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+@contextmanager
+def writer_lock(config, wait=False):
+    """Hold an exclusive lock on index_folder, so only one process writes the index at a time.
+
+    Several API workers can each accept a reindex request; the second one to start
+    fails with IndexLocked instead of appending to the same segment. With `wait`,
+    it blocks until the lock is free instead. The OS drops the lock if the holder
+    dies, so there is nothing stale to clean up.
+    """
+    folder = Path(config["index_folder"])
+    folder.mkdir(parents=True, exist_ok=True)
+    try:
+        f = lock_file(folder / LOCK_FILE, wait)
+    except OSError:
+        raise IndexLocked("Another process is already indexing")
+    try:
+        yield
+    finally:
+        unlock_file(f)
+
+
+class IndexWriter:
+    """Streams chunk records into a segment and publishes it atomically on commit().
+
+    The .vectors/.chunks/.texts files are raw, append-only arrays. Readers only map
+    the first `count` rows recorded in index.json, so nothing they see changes until
+    commit() swaps index.json with os.replace.
+
+    With `base`, rows are appended to the base index's segment instead of a fresh
+    one, and replaced or removed files are tombstoned rather than rewritten.
+    """
+
+    def __init__(self, config, base=None):
+        self.folder = Path(config["index_folder"])
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.config = config
+        self.base = base
+        self._file_ids = {}
+        self._current_file = None
+        # path -> ids of its live entries, so deletes and touches don't scan every file.
+        self._live = {}
+        if base is None:
+            self.dtype = np.dtype(VECTOR_DTYPES[config.get("vector_dtype", "float32")])
+            self.segment = f"seg-{uuid.uuid4().hex[:12]}"
+            self.files = []
+            self.count = 0
+            self.dim = None
+            self._text_offset = 0
+            self.lexical = []
+            self.quantized = None
+            self.simhash = None
+            mode = "wb"
+        else:
+            self.dtype = np.dtype(base.info["dtype"])
+            self.segment = base.info["segment"]
+            self.files = [dict(entry) for entry in base.file_entries]
+            self.count = base.count
+            self.dim = base.dim or None
+            self._text_offset = base.text_bytes
+            self.lexical = base.info.get("lexical", [])
+            self.quantized = base.info.get("quantized")
+            self.simhash = base.info.get("simhash")
+            mode = "r+b"
+        for file_id, entry in enumerate(self.files):
+            if not entry["deleted"]:
+                self._live.setdefault(entry["path"], []).append(file_id)
+        self._first_new_file = len(self.files)
+        self.paths = _segment_paths(self.folder, self.segment)
+        for path in self.paths.values():
+            path.touch()
+        self._vectors = open(self.paths["vectors"], mode)
+        self._chunks = open(self.paths["chunks"], mode)
+        self._texts = open(self.paths["texts"], mode)
+        if base is not None:
+            # Drop anything a crashed, unpublished append left behind.
+            for f, size in ((self._vectors, self.count * (self.dim or 0) * self.dtype.itemsize),
+                            (self._chunks, self.count * CHUNK_DTYPE.itemsize),
+                            (self._texts, self._text_offset)):
+                f.truncate(size)
+                f.seek(size)
+
+    def describe_file(self, path, size=None, mtime=None, hash=None, duplicate_of=None):
+        """Start a new file entry; chunks added for `path` afterwards belong to it.
+
+        `duplicate_of` marks a byte-identical copy of another indexed file; it has
+        no rows of its own.
+        """
+        entry = {"path": path, "size": size, "mtime": mtime, "hash": hash,
+                 "rows": [self.count, self.count], "deleted": False}
+        if duplicate_of:
+            entry["duplicate_of"] = duplicate_of
+        self._file_ids[path] = len(self.files)
+        self._current_file = len(self.files)
+        self._live.setdefault(path, []).append(self._current_file)
+        self.files.append(entry)
+        return self._current_file
+
+    def delete_file(self, path):
+        """Tombstone every live entry for `path` that predates this writer."""
+        live = self._live.get(path, [])
+        for file_id in live:
+            if file_id < self._first_new_file:
+                self.files[file_id]["deleted"] = True
+        live[:] = [file_id for file_id in live if file_id >= self._first_new_file]
+
+    def touch_file(self, path, **meta):
+        """Refresh stat metadata of an unchanged file without touching its rows."""
+        for file_id in self._live.get(path, []):
+            self.files[file_id].update(meta)
+
+    def _file_id(self, filename, row):
+        file_id = self._file_ids.get(filename)
+        # A file's rows must stay contiguous so they can be tombstoned as one range.
+        if file_id is None or (file_id != self._current_file and self.files[file_id]["rows"][1] != row):
+            file_id = self.describe_file(filename)
+            # Started partway through a batch of records: its rows begin at `row`, not at self.count.
+            self.files[file_id]["rows"] = [row, row]
+        self._current_file = file_id
+        return file_id
+
+    def add(self, records):
+        """Append records shaped like embed_documents() output."""
+        if not records:
+            return
+        vectors = np.asarray([r["embedding"] for r in records], dtype=np.float32)
+        # Stored unit-length so cosine similarity is a plain dot product at query time.
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        vectors = vectors.astype(self.dtype)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {vectors.shape[1]}")
+
+        rows = np.zeros(len(records), dtype=CHUNK_DTYPE)
+        for i, record in enumerate(records):
+            data = record["text"].encode("utf-8")
+            file_id = self._file_id(record["filename"], self.count + i)
+            rows[i] = (file_id, record.get("chunk_id", -1), self._text_offset, len(data), record.get("page") or 0)
+            self.files[file_id]["rows"][1] = self.count + i + 1
+            self._texts.write(data)
+            self._text_offset += len(data)
+
+        self._vectors.write(np.ascontiguousarray(vectors).tobytes())
+        self._chunks.write(rows.tobytes())
+        self.count += len(records)
+
+    def _close(self):
+        for f in (self._vectors, self._chunks, self._texts):
+            if not f.closed:
+                f.flush()
+                os.fsync(f.fileno())
+                f.close()
+
+    def commit(self, before_publish=None):
+        """Flush the segment and publish it.
+
+        `before_publish(store)` can derive extra files (ANN index, postings) from the
+        finished segment before readers see it; a dict it returns is merged into
+        index.json.
+        """
+        self._close()
+        previous = read_index_info(self.folder)
+        info = {
+            "format": FORMAT_VERSION,
+            "version": (previous or {}).get("version", 0) + 1,
+            "segment": self.segment,
+            "count": self.count,
+            "dim": self.dim or 0,
+            "dtype": self.dtype.name,
+            "normalized": True,
+            "model": self.config.get("embedding_model"),
+            "text_bytes": self._text_offset,
+            "lexical": self.lexical,
+            "quantized": self.quantized,
+            "simhash": self.simhash,
+            "files": self.files,
+        }
+        if before_publish is not None:
+            info.update(before_publish(StoredIndex(self.folder, info)) or {})
+        _write_json_atomic(self.folder / INDEX_FILE, info)
+
+        if previous and previous.get("segment") != self.segment:
+            _remove_segment(self.folder, previous["segment"])
+        return info
+
+    def abort(self):
+        self._close()
+        # An aborted append leaves the shared segment as-is; the next writer truncates it.
+        if self.base is None:
+            _remove_segment(self.folder, self.segment)
+
+
+def _remove_segment(folder, segment):
+    # Covers the data files plus anything derived from the segment, like ANN indexes.
+    for path in Path(folder).glob(f"{segment}.*"):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Still mapped by a reader on platforms that lock open files; harmless leftover.
+            logger.warning(f"Could not remove old index file {path}: {e}")
+
+
+class StoredIndex:
+    """Read-only, memory-mapped view of a published index."""
+
+    def __init__(self, folder, info):
+        self.folder = Path(folder)
+        self.info = info
+        self.version = info["version"]
+        self.count = info["count"]
+        self.dim = info["dim"]
+        # Format 1 stored bare paths; later formats store manifest entries.
+        self.file_entries = [e if isinstance(e, dict) else {"path": e} for e in info["files"]]
+        self.paths = [e["path"] for e in self.file_entries]
+        self.files = list(dict.fromkeys(e["path"] for e in self.file_entries if not e.get("deleted")))
+        # Stored file -> live byte-identical copies of it that have no rows of their own.
+        self.duplicates = {}
+        for e in self.file_entries:
+            if e.get("duplicate_of") and not e.get("deleted"):
+                self.duplicates.setdefault(e["duplicate_of"], []).append(e["path"])
+        paths = _segment_paths(folder, info["segment"])
+        if self.count:
+            self.vectors = np.memmap(paths["vectors"], dtype=info["dtype"], mode="r", shape=(self.count, self.dim))
+            self.chunks = np.memmap(paths["chunks"], dtype=chunk_dtype(info), mode="r", shape=(self.count,))
+            last = self.chunks[-1]
+            self.text_bytes = info.get("text_bytes", int(last["text_offset"]) + int(last["text_length"]))
+            self.texts = np.memmap(paths["texts"], dtype=np.uint8, mode="r", shape=(self.text_bytes,)) if self.text_bytes else np.zeros(0, np.uint8)
+        else:
+            self.vectors = np.zeros((0, self.dim), dtype=info["dtype"])
+            self.chunks = np.zeros(0, dtype=chunk_dtype(info))
+            self.texts = np.zeros(0, dtype=np.uint8)
+            self.text_bytes = 0
+        self.live = self._live_mask()
+        self.live_count = self.count if self.live is None else int(self.live.sum())
+
+    def _live_mask(self):
+        """Boolean row mask with tombstoned files cleared, or None when nothing is deleted."""
+        dead = [e["rows"] for e in self.file_entries if e.get("deleted")]
+        if not dead:
+            return None
+        live = np.ones(self.count, dtype=bool)
+        for start, end in dead:
+            live[start:end] = False
+        return live
+
+    @cached_property
+    def signatures(self):
+        """Per-row SimHash signatures (see backend.dedup), or None unless they cover every row."""
+        from backend.dedup import load_signatures
+        return load_signatures(self)
+
+    def live_files(self):
+        """Manifest entries of files that are currently indexed, keyed by path."""
+        return {e["path"]: e for e in self.file_entries if not e.get("deleted")}
+
+    def __len__(self):
+        return self.count
+
+    def filename(self, i):
+        return self.paths[int(self.chunks[i]["file_id"])]
+
+    def text(self, i):
+        row = self.chunks[i]
+        start = int(row["text_offset"])
+        return self.texts[start:start + int(row["text_length"])].tobytes().decode("utf-8")
+
+    def page(self, i):
+        """1-based page the chunk starts on, or None."""
+        if "page" not in self.chunks.dtype.names:
+            return None
+        return int(self.chunks[i]["page"]) or None
+
+    def record(self, i):
+        """Chunk metadata and text as a plain dict (no embedding)."""
+        return {
+            "filename": self.filename(i),
+            "chunk_id": int(self.chunks[i]["chunk_id"]),
+            "page": self.page(i),
+            "text": self.text(i),
+        }
+
+
+def load_index(config, lock_held=False):
+    """Open the current index, migrating a legacy embeddings.json on first use.
+
+    The migration publishes a segment, so it runs under writer_lock: API workers
+    starting together wait for the first one's migration instead of each
+    publishing (and removing the others') segments. Writers already holding the
+    lock pass `lock_held=True`.
+    """
+    folder = Path(config["index_folder"])
+    info = read_index_info(folder)
+    if info is None and (folder / LEGACY_INDEX_FILE).exists():
+        if lock_held:
+            migrate_json_index(config)
+        else:
+            with writer_lock(config, wait=True):
+                if read_index_info(folder) is None:
+                    migrate_json_index(config)
+        info = read_index_info(folder)
+    if info is None:
+        return None
+    return StoredIndex(folder, info)
+
+
+def migrate_json_index(config, batch_size=10000):
+    """One-time conversion of the old indented-JSON embeddings.json to the binary format.
+
+    The legacy file is left in place; index.json takes precedence once it exists.
+    """
+    legacy_path = Path(config["index_folder"]) / LEGACY_INDEX_FILE
+    logger.info(f"Migrating {legacy_path} to binary index format")
+    with open(legacy_path, encoding="utf-8") as f:
+        data = json.load(f)
+    writer = IndexWriter(config)
+    try:
+        for i in range(0, len(data), batch_size):
+            writer.add([item for item in data[i:i + batch_size] if "embedding" in item])
+    except Exception:
+        writer.abort()
+        raise
+    info = writer.commit()
+    logger.info(f"Migrated {info['count']} chunks")
+    return info
+
+
+def can_append(store, config):
+    """Whether an incremental update may extend `store` rather than rebuild it."""
+    return (
+        store is not None
+        and store.info.get("format") == FORMAT_VERSION
+        and store.info.get("model") == config.get("embedding_model")
+        and store.info.get("dtype") == config.get("vector_dtype", "float32")
+    )
+
+
+def compact_index(config, before_publish=None, batch_size=10000):
+    """Rewrite the live rows of the current index into a fresh segment, dropping tombstones.
+
+    The caller holds writer_lock.
+    """
+    store = load_index(config, lock_held=True)
+    if store is None or store.live is None:
+        return None
+    logger.info(f"Compacting index: {store.count - store.live_count} of {store.count} rows are tombstoned")
+    writer = IndexWriter(config)
+    try:
+        for entry in store.file_entries:
+            if entry.get("deleted"):
+                continue
+            writer.describe_file(entry["path"], entry.get("size"), entry.get("mtime"), entry.get("hash"),
+                                 entry.get("duplicate_of"))
+            start, end = entry["rows"]
+            for i in range(start, end, batch_size):
+                stop = min(i + batch_size, end)
+                vectors = np.asarray(store.vectors[i:stop], dtype=np.float32)
+                writer.add([
+                    {"filename": entry["path"], "chunk_id": int(store.chunks[j]["chunk_id"]),
+                     "page": store.page(j), "text": store.text(j), "embedding": vectors[j - i]}
+                    for j in range(i, stop)
+                ])
+        return writer.commit(before_publish)
+    except Exception:
+        writer.abort()
+        raise
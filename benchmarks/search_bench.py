@@ -0,0 +1,263 @@
+"""Indexing throughput, search latency and recall benchmark on synthetic corpora.
+
+For each corpus size, a fresh interpreter generates JSON files under a temporary
+source folder, indexes them with `run_indexing(full=True)` and then times every
+search backend against exact brute force. Embeddings come from a hashed
+bag-of-words random projection, so the run is offline and deterministic.
+
+    python benchmarks/search_bench.py --sizes 10000 100000 1000000 --output bench.json
+    python benchmarks/search_bench.py --sizes 10000 --min-recall 0.9   # exits 1 below this
+
+Reported per size: files/s and chunks/s while indexing, peak RSS (this process
+and parse workers), bytes on disk, and p50/p99 latency plus recall@k of each
+backend (exact, faiss flat/hnsw/ivfpq when faiss is installed, int8, binary).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TOKEN_RE = re.compile(r"\w+")
+CHUNKS_PER_FILE = 10
+CHUNK_SIZE = 500
+VOCAB_SIZE = 50000
+TOPICS = 200
+
+
+class RandomProjectionEmbedder:
+    """Offline stand-in for SentenceTransformer: each token hashes to a fixed Gaussian
+    vector and a text embeds as the sum of its tokens' vectors."""
+
+    def __init__(self, dim=384, buckets=1 << 16, seed=0):
+        self.dim = dim
+        self.buckets = buckets
+        self.projection = np.random.default_rng(seed).standard_normal((buckets, dim)).astype(np.float32)
+
+    def encode(self, texts, batch_size=32, convert_to_tensor=False, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            ids = [zlib.crc32(token.encode()) % self.buckets for token in TOKEN_RE.findall(text.lower())]
+            if ids:
+                out[i] = self.projection[ids].sum(axis=0)
+        return out[0] if single else out
+
+
+def generate_corpus(folder, chunks, seed=0):
+    """Write about `chunks` chunks of topical Zipf-distributed text as JSON files."""
+    rng = np.random.default_rng(seed)
+    files = max(1, chunks // CHUNKS_PER_FILE)
+    cdf = np.cumsum(1.0 / np.arange(1, VOCAB_SIZE + 1))
+    cdf /= cdf[-1]
+    # "w123 " averages about 6 characters.
+    words_per_file = CHUNK_SIZE * CHUNKS_PER_FILE // 6
+    for n in range(files):
+        words = np.minimum(np.searchsorted(cdf, rng.random(words_per_file)), VOCAB_SIZE - 1)
+        # Half the words come from the file's topic, so similar files share vocabulary.
+        topic = rng.integers(TOPICS)
+        words = np.where(rng.random(words_per_file) < 0.5, (words + topic * 97) % VOCAB_SIZE, words)
+        ends = np.cumsum(rng.integers(8, 16, size=words_per_file // 8))
+        sentences = [" ".join(f"w{w}" for w in words[a:b]) + "."
+                     for a, b in zip(np.concatenate([[0], ends[:-1]]), ends) if a < words_per_file]
+        sub = Path(folder) / f"d{n // 1000:04d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        (sub / f"f{n:07d}.json").write_text(json.dumps({"text": " ".join(sentences)}))
+    return files
+
+
+def folder_bytes(folder, exclude=()):
+    return sum(p.stat().st_size for p in Path(folder).rglob("*") if p.is_file() and p.name not in exclude)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2**20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2**20
+    return round(own, 1), round(children, 1)
+
+
+def latency_summary(samples):
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "mean_ms": round(float(ms.mean()), 3)}
+
+
+def time_backend(rank, queries, exact, k):
+    """Run `rank(query) -> [(row, score)]` over all queries; latency and recall@k vs exact."""
+    latencies, recalls = [], []
+    for query, truth in zip(queries, exact):
+        start = time.perf_counter()
+        hits = rank(query)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({row for row, _ in hits[:k]} & truth) / max(len(truth), 1))
+    return {**latency_summary(latencies), f"recall_at_{k}": round(statistics.mean(recalls), 4)}
+
+
+def run_size(chunks, workdir, num_queries, k, workers):
+    from backend import embedder
+    from backend.ann import ANN_TYPES, build_ann_index, load_ann_index
+    from backend.engine import SearchEngine
+    from backend.indexer import run_indexing
+    from backend.quantization import QUANTIZATION_TYPES, QuantizedVectors, build_quantized
+    from backend.search import batch_top_k, rank_chunks, rank_chunks_ann, rank_chunks_quantized
+    from backend.storage import load_index
+
+    source, index = Path(workdir) / "source", Path(workdir) / "index"
+    config = {
+        "source_folder": str(source), "index_folder": str(index), "supported_extensions": [".json"],
+        "chunk_size": CHUNK_SIZE, "chunk_overlap": 50, "embedding_model": "random-projection",
+        "min_score": -1.0, "index_workers": workers, "embedding_cache": False,
+    }
+    Path(workdir, "config.json").write_text(json.dumps(config))
+    os.chdir(workdir)  # run_indexing reads ./config.json
+    embedder.set_model(config, RandomProjectionEmbedder())
+
+    start = time.perf_counter()
+    files = generate_corpus(source, chunks)
+    generate_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_indexing(full=True)
+    index_s = time.perf_counter() - start
+    start = time.perf_counter()
+    run_indexing()
+    noop_s = time.perf_counter() - start
+
+    store = load_index(config)
+    result = {
+        "target_chunks": chunks,
+        "files": files,
+        "chunks": len(store),
+        "generate_s": round(generate_s, 2),
+        "indexing": {
+            "elapsed_s": round(index_s, 2),
+            "files_per_s": round(files / index_s, 1),
+            "chunks_per_s": round(len(store) / index_s, 1),
+            "noop_reindex_s": round(noop_s, 2),
+        },
+        "index_bytes": folder_bytes(index, exclude=("embedding_cache.sqlite",)),
+    }
+
+    rng = np.random.default_rng(1)
+    texts = []
+    for row in rng.choice(len(store), size=num_queries, replace=False):
+        words = TOKEN_RE.findall(store.text(int(row)))
+        offset = rng.integers(max(1, len(words) - 6))
+        texts.append(" ".join(words[offset:offset + 6]))
+    queries = embedder.encode_queries(texts, config)
+    exact = [{row for row, _ in hits} for hits in batch_top_k(store, queries, k)]
+
+    backends = {"exact": time_backend(lambda q: rank_chunks(store, q, "", k, -np.inf), queries, exact, k)}
+    if importlib.util.find_spec("faiss") is not None:
+        for kind in ANN_TYPES:
+            ann_config = dict(config, ann_index=kind)
+            start = time.perf_counter()
+            build_ann_index(store, ann_config)
+            build_s = time.perf_counter() - start
+            ann_index = load_ann_index(store, ann_config)
+            if ann_index is None:
+                continue
+            stats = time_backend(lambda q: rank_chunks_ann(store, ann_index, q, "", k, -np.inf, num_candidates=100),
+                                 queries, exact, k)
+            backends[f"ann_{kind}"] = {**stats, "build_s": round(build_s, 2)}
+    for kind in QUANTIZATION_TYPES:
+        start = time.perf_counter()
+        store.info["quantized"] = build_quantized(store, dict(config, vector_quantization=kind))
+        build_s = time.perf_counter() - start
+        quantized = QuantizedVectors(store)
+        stats = time_backend(lambda q: rank_chunks_quantized(store, quantized, q, "", k, -np.inf, num_candidates=200),
+                             queries, exact, k)
+        backends[kind] = {**stats, "build_s": round(build_s, 2)}
+    result["search"] = backends
+
+    # End to end as the API runs it: hybrid fusion, highlighting, result dicts.
+    engine = SearchEngine(config)
+    latencies = []
+    for query, text in zip(queries, texts):
+        start = time.perf_counter()
+        engine.search(query, text, top_k=k)
+        latencies.append(time.perf_counter() - start)
+    result["engine_search"] = latency_summary(latencies)
+    start = time.perf_counter()
+    engine.search_batch(queries, [{"q": text, "top_k": k} for text in texts])
+    result["engine_search_batch"] = {"queries_per_s": round(len(texts) / (time.perf_counter() - start), 1)}
+
+    own, children = peak_rss_mb()
+    result["peak_rss_mb"] = {"main": own, "parse_workers": children}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=0, help="index_workers for parsing (0 = one per core)")
+    parser.add_argument("--workdir", help="where corpora and indexes are written (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep generated corpora and indexes")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--min-recall", type=float, help="exit 1 if any backend's recall@k falls below this")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        # Child process: one size, result as JSON on the last line of stdout.
+        result = run_size(args.single, args.workdir, args.queries, args.k, args.workers)
+        print(json.dumps(result))
+        return
+
+    base = Path(args.workdir or tempfile.mkdtemp(prefix="search-bench-"))
+    results = []
+    try:
+        for size in args.sizes:
+            workdir = base / f"n{size}"
+            workdir.mkdir(parents=True, exist_ok=True)
+            # A fresh interpreter per size keeps peak RSS figures independent.
+            out = subprocess.run(
+                [sys.executable, __file__, "--single", str(size), "--workdir", str(workdir),
+                 "--queries", str(args.queries), "--k", str(args.k), "--workers", str(args.workers)],
+                capture_output=True, text=True,
+            )
+            if out.returncode != 0:
+                sys.stderr.write(out.stderr)
+                raise SystemExit(f"Benchmark for {size} chunks failed")
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    finally:
+        if not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
+
+    text = json.dumps({"k": args.k, "queries": args.queries, "results": results}, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text)
+    if args.min_recall is not None:
+        low = [(r["chunks"], name, stats[f"recall_at_{args.k}"]) for r in results
+               for name, stats in r["search"].items() if stats[f"recall_at_{args.k}"] < args.min_recall]
+        for chunks, name, recall in low:
+            sys.stderr.write(f"{name} recall@{args.k} {recall} < {args.min_recall} at {chunks} chunks\n")
+        if low:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,8 @@ interface EmbedMatch {
   text?: string;
   score: number;
   chunk_id?: any
+  page?: number | null;
+  duplicates?: string[];
 }
 interface PreservedResults {
   fileMatches: FileMatch[];
@@ -290,7 +292,8 @@ const Search: React.FC<SearchProps> = ({
                 <div className="result-card">
                   <div className="result-header">
                     <div className="result-text">
-                      File: {filename} ({chunks.length} match{chunks.length > 1 ? 'es' : ''})
+                      File: {filename}{firstChunk.page ? `, page ${firstChunk.page}` : ''} ({chunks.length} match{chunks.length > 1 ? 'es' : ''})
+                      {firstChunk.duplicates?.length ? ` +${firstChunk.duplicates.length} cop${firstChunk.duplicates.length > 1 ? 'ies' : 'y'}` : ''}
                     </div>
                     <button
                       className="open-folder-btn"
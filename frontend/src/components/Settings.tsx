@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import './Settings.scss';
-import { getConfig, updateConfig, runReindex } from '../utils/api';
+import { getConfig, updateConfig, runReindex, getReindexJob } from '../utils/api';
 
 interface SettingsProps {
   setToast: (msg: string) => void;
@@ -40,9 +40,15 @@ const Settings: React.FC<SettingsProps> = ({ setToast, goBack }) => {
     setLoading(true);
     try {
       const response = await runReindex();
-      setToast(response?.data?.status || 'Indexing done.');
+      let job = response.data;
+      while (job.state === 'queued' || job.state === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await getReindexJob(job.job_id)).data;
+      }
+      setToast(job.error ? `${job.status} ${job.error}` : job.status || 'Indexing done.');
     } catch (e: any) {
-      setToast('Indexing failed: ' + e.message);
+      const detail = e.response?.data?.detail;
+      setToast('Indexing failed: ' + (detail?.message || e.message));
     }
     setLoading(false);
   };
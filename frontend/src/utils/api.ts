@@ -11,9 +11,10 @@ const api = axios.create({
 
 export const getConfig = () => api.get('/config');
 export const updateConfig = (data: any) => api.post('/config', data);
-export const runReindex = () => api.post('/reindex', {}, { timeout: 60000 });
-export const runSearch = (query: string) => {
-  return api.get('/search', { params: { q: query } });
+export const runReindex = () => api.post('/reindex', {});
+export const getReindexJob = (jobId: string) => api.get(`/reindex/${jobId}`);
+export const runSearch = (query: string, offset = 0, limit = 5) => {
+  return api.get('/search', { params: { q: query, offset, limit } });
 };
 export const openFolder = (path: string) => {
   return api.post('/open-folder', { path });
@@ -0,0 +1,64 @@
+import json
+import zlib
+
+import numpy as np
+import pytest
+
+from backend import embedder
+from backend.config import load_config
+
+
+class HashEmbedder:
+    """Stand-in for SentenceTransformer: a text embeds as counts of its hashed words."""
+
+    dim = 1024
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i, zlib.crc32(word.strip(".,").encode()) % self.dim] += 1
+        return out[0] if single else out
+
+
+class Workspace:
+    """A source folder, an index folder and ./config.json pointing at them."""
+
+    def __init__(self, root):
+        self.root = root
+        self.source = root / "source"
+        self.source.mkdir()
+        self.write_config()
+
+    def write_config(self, **overrides):
+        config = {
+            "source_folder": str(self.source),
+            "index_folder": str(self.root / "index"),
+            "supported_extensions": [".json"],
+            "chunk_size": 200,
+            "chunk_overlap": 20,
+            "embedding_model": "hash-test",
+            "min_score": -1.0,
+            "index_workers": 1,
+            **overrides,
+        }
+        (self.root / "config.json").write_text(json.dumps(config))
+        embedder.set_model(config, HashEmbedder())
+
+    @property
+    def config(self):
+        return load_config(str(self.root / "config.json"))
+
+    def write(self, name, text):
+        path = self.source / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"text": text}))
+        return path
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # run_indexing reads ./config.json
+    return Workspace(tmp_path)
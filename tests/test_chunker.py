@@ -0,0 +1,85 @@
+import random
+import re
+
+from backend import chunker
+from backend.chunker import _char_chunks, _token_chunks, iter_blocks, iter_chunks
+
+WORD_RE = re.compile(r"\S+")
+
+
+class WhitespaceTokenizer:
+    """Fast-tokenizer stand-in: one token per run of non-space characters, with offsets."""
+
+    is_fast = True
+
+    def __call__(self, texts, **kwargs):
+        return {"offset_mapping": [[m.span() for m in WORD_RE.finditer(text)] for text in texts]}
+
+
+def _random_text(seed=0, sentences=400):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon"]
+    return " ".join(" ".join(rng.choice(words) for _ in range(rng.randint(3, 150))) + "."
+                    for _ in range(sentences))
+
+
+def _assert_each_chunk_moves_past_the_previous(spans):
+    for (_, previous_end), (_, end) in zip(spans, spans[1:]):
+        assert end > previous_end, "chunk lies inside the previous chunk's overlap"
+
+
+def test_long_sentence_after_a_chunk_is_split_not_repeated_as_overlap():
+    text = "YesLogic Pty. Ltd. " + "word " * 200 + "end."
+    chunks = [c["text"] for c in iter_chunks({"filename": "x", "text": text}, {"chunk_size": 500, "chunk_overlap": 50})]
+    assert chunks[0] == "YesLogic Pty. Ltd."
+    assert all(len(chunk) > len("Ltd.") for chunk in chunks)
+    assert sum("YesLogic" in chunk for chunk in chunks) <= 2
+
+
+def test_char_chunks_never_fall_inside_the_previous_overlap():
+    text = _random_text()
+    spans = list(_char_chunks(text, 500, 50))
+    _assert_each_chunk_moves_past_the_previous(spans)
+    assert all(end - start <= 500 for start, end in spans)
+
+
+def test_token_chunks_never_fall_inside_the_previous_overlap():
+    text = _random_text(seed=1, sentences=200)
+    spans = list(_token_chunks(text, 100, 10, WhitespaceTokenizer()))
+    _assert_each_chunk_moves_past_the_previous(spans)
+    assert all(len(WORD_RE.findall(text[start:end])) <= 100 for start, end in spans)
+
+
+def test_chunks_cover_the_whole_text():
+    text = _random_text(seed=2, sentences=100)
+    spans = list(_char_chunks(text, 300, 30))
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        assert start <= previous_end
+
+
+def test_blocks_join_sections_and_record_where_each_starts():
+    blocks = list(iter_blocks([(1, "page one"), (2, ""), (3, "page three"), (None, "tail")]))
+    assert blocks == [("page one\npage three\ntail", [0, 9, 20], [1, 3, None])]
+    text, starts, pages = blocks[0]
+    assert [text[start:].split("\n")[0] for start in starts] == ["page one", "page three", "tail"]
+
+
+def test_blocks_are_cut_between_sections_once_large_enough(monkeypatch):
+    monkeypatch.setattr(chunker, "BLOCK_CHARS", 25)
+    sections = [(page, f"text of page {page}") for page in range(1, 7)]
+    blocks = list(iter_blocks(iter(sections)))
+    assert len(blocks) > 1
+    assert [page for _, _, pages in blocks for page in pages] == list(range(1, 7))
+    for text, starts, pages in blocks:
+        assert [text[start:start + len(f"text of page {page}")] for start, page in zip(starts, pages)] == \
+            [f"text of page {page}" for page in pages]
+
+
+def test_chunks_record_the_page_they_start_on():
+    sections = [(page, " ".join(f"page{page}word{i}." for i in range(40))) for page in range(1, 5)]
+    chunks = list(iter_chunks({"filename": "x", "sections": sections}, {"chunk_size": 150, "chunk_overlap": 30}))
+    assert {chunk["page"] for chunk in chunks} == {1, 2, 3, 4}
+    for chunk in chunks:
+        assert chunk["text"].startswith(f"page{chunk['page']}word")
+    assert [chunk["chunk_id"] for chunk in chunks] == list(range(len(chunks)))
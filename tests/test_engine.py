@@ -0,0 +1,53 @@
+import json
+import os
+
+from backend.config import load_config
+from backend.engine import SearchEngine
+
+
+def _write_config(path, **overrides):
+    config = {
+        "source_folder": str(path / "source"),
+        "index_folder": str(path / "index"),
+        "supported_extensions": [".json"],
+        "chunk_size": 200,
+        "chunk_overlap": 20,
+        "embedding_model": "hash-test",
+        "min_score": 0.0,
+        **overrides,
+    }
+    (path / "config.json").write_text(json.dumps(config))
+
+
+def test_config_saved_by_another_worker_is_picked_up(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_config(tmp_path, fusion="rrf")
+    engine = SearchEngine(load_config())
+    try:
+        stat = os.stat("config.json")
+        # Another worker handles POST /config.
+        _write_config(tmp_path, fusion="none", result_cache_size=7)
+        os.utime("config.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        engine.current()
+
+        assert engine.config["fusion"] == "none"
+        assert engine.results.max_entries == 7
+    finally:
+        engine.close()
+
+
+def test_unreadable_config_keeps_the_current_settings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_config(tmp_path, fusion="rrf")
+    engine = SearchEngine(load_config())
+    try:
+        stat = os.stat("config.json")
+        (tmp_path / "config.json").write_text('{"fusion": ')  # caught mid-write
+        os.utime("config.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        engine.current()
+
+        assert engine.config["fusion"] == "rrf"
+    finally:
+        engine.close()
@@ -0,0 +1,143 @@
+"""Incremental reindexing: the manifest plan, tombstones, compaction and forced rebuilds."""
+import json
+import os
+
+from backend.embedder import encode_query
+from backend.engine import SearchEngine
+from backend.indexer import build_side_indexes, run_indexing
+from backend.manifest import file_hash, plan_changes, scan_source_files
+from backend.storage import INDEX_FILE, can_append, compact_index, load_index, writer_lock
+
+
+def _hits(config, query, top_k=10):
+    engine = SearchEngine(config)
+    try:
+        result = engine.search(encode_query(query, config), query, top_k=top_k)
+    finally:
+        engine.close()
+    return [(os.path.basename(hit["filename"]), hit["text"], round(hit["score"], 6))
+            for hit in result["embedMatch"] if hit["filename"]]
+
+
+def _bump_mtime(path, seconds=10):
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + seconds))
+
+
+def test_plan_sorts_files_into_added_modified_touched_and_deleted(workspace):
+    kept = workspace.write("kept.json", "unchanged content")
+    touched = workspace.write("touched.json", "same bytes, newer mtime")
+    modified = workspace.write("modified.json", "old content")
+    gone = workspace.write("gone.json", "about to be deleted")
+    indexed = {
+        str(path.resolve()): {"size": path.stat().st_size, "mtime": path.stat().st_mtime, "hash": file_hash(path)}
+        for path in (kept, touched, modified, gone)
+    }
+    _bump_mtime(touched)
+    workspace.write("modified.json", "new content, and longer")
+    gone.unlink()
+    added = workspace.write("added.json", "a brand new file")
+
+    changed, touched_meta, deleted = plan_changes(scan_source_files(workspace.config), indexed)
+
+    assert set(changed) == {str(modified.resolve()), str(added.resolve())}
+    assert changed[str(added.resolve())]["hash"] == file_hash(added)
+    assert set(touched_meta) == {str(touched.resolve())}
+    assert touched_meta[str(touched.resolve())]["mtime"] == touched.stat().st_mtime
+    assert deleted == [str(gone.resolve())]
+
+
+def test_reindex_parses_only_new_and_changed_files(workspace):
+    workspace.write("a.json", "giraffes eat acacia leaves")
+    workspace.write("b.json", "zebras graze on the savanna")
+    assert run_indexing() == 2
+    assert run_indexing() == 0
+
+    _bump_mtime(workspace.source / "a.json")
+    assert run_indexing() == 0  # touched, not re-parsed
+    workspace.write("b.json", "zebras graze on the open savanna at dawn")
+    workspace.write("c.json", "lions sleep most of the day")
+    assert run_indexing() == 2
+
+    store = load_index(workspace.config)
+    assert store.live_files()[str((workspace.source / "a.json").resolve())]["mtime"] == \
+        (workspace.source / "a.json").stat().st_mtime
+
+
+def test_tombstoned_rows_are_excluded_from_search(workspace):
+    workspace.write("a.json", "giraffes eat acacia leaves")
+    workspace.write("b.json", "zebras graze on the savanna")
+    workspace.write_config(compact_threshold=1.0)
+    run_indexing()
+
+    (workspace.source / "a.json").unlink()
+    workspace.write("b.json", "zebras sleep standing up")
+    run_indexing()
+
+    store = load_index(workspace.config)
+    assert store.live_count < store.count  # old rows are still in the segment
+    hits = _hits(workspace.config, "giraffes acacia zebras savanna")
+    assert [name for name, _, _ in hits] == ["b.json"]
+    assert "zebras sleep standing up" in hits[0][1]
+
+
+def test_compaction_keeps_search_results_identical(workspace):
+    for i in range(8):
+        # Each text differs in length and mix, so no two hits tie on score.
+        workspace.write(f"f{i}.json", f"document {i} about animal{i} and shared" + " savanna words" * (i + 1))
+    workspace.write_config(compact_threshold=1.0)
+    run_indexing()
+    for i in range(0, 8, 2):
+        (workspace.source / f"f{i}.json").unlink()
+    workspace.write("f1.json", "document 1 rewritten about animal1 and the savanna")
+    run_indexing()
+    queries = ["animal1 savanna", "document shared words", "savanna words"]
+    before = [_hits(workspace.config, q) for q in queries]
+    segment = load_index(workspace.config).info["segment"]
+
+    config = workspace.config
+    with writer_lock(config):
+        compact_index(config, before_publish=lambda store: build_side_indexes(store, config))
+
+    store = load_index(workspace.config)
+    assert store.info["segment"] != segment
+    assert store.live_count == store.count
+    assert [_hits(config, q) for q in queries] == before
+
+
+def test_can_append_requires_same_format_model_and_dtype(workspace):
+    workspace.write("a.json", "giraffes eat acacia leaves")
+    run_indexing()
+    config = workspace.config
+    store = load_index(config)
+
+    assert can_append(store, config)
+    assert not can_append(store, {**config, "embedding_model": "another-model"})
+    assert not can_append(store, {**config, "vector_dtype": "float16"})
+    assert not can_append(_with_format(store, 2), config)
+    assert not can_append(None, config)
+
+
+def _with_format(store, version):
+    path = store.folder / INDEX_FILE
+    info = json.loads(path.read_text())
+    info["format"] = version
+    path.write_text(json.dumps(info))
+    return load_index({"index_folder": str(store.folder)})
+
+
+def test_model_or_format_change_rebuilds_everything(workspace):
+    workspace.write("a.json", "giraffes eat acacia leaves")
+    workspace.write("b.json", "zebras graze on the savanna")
+    run_indexing()
+    segment = load_index(workspace.config).info["segment"]
+
+    workspace.write_config(embedding_model="hash-test-2")
+    assert run_indexing() == 2
+    store = load_index(workspace.config)
+    assert store.info["segment"] != segment and store.info["model"] == "hash-test-2"
+    assert store.live_count == store.count == 2
+
+    _with_format(store, 2)
+    assert run_indexing() == 2
+    assert load_index(workspace.config).info["format"] != 2
@@ -0,0 +1,36 @@
+"""Indexing regression checks, run offline with a hashed bag-of-words embedder."""
+import sys
+import types
+
+from backend import parsers
+from backend.indexer import run_indexing
+from backend.storage import load_index
+
+
+def _batch_parser():
+    """A parser module offering only parse_batch(), the way image_parser does."""
+    module = types.ModuleType("backend.parsers.stub_batch_parser")
+
+    def parse_batch(paths, ocr_workers=4, caption_batch_size=8):
+        for path in paths:
+            yield path, f"A caption for {path.stem}: a zebra standing in tall grass."
+
+    module.parse_batch = parse_batch
+    module.parse = lambda path: next(parse_batch([path]))[1]
+    return module
+
+
+def test_batch_parsed_files_index_next_to_ordinary_files(workspace, monkeypatch):
+    (workspace.source / "photo.stub").write_text("not really an image")
+    workspace.write("notes.json", "giraffes eat acacia leaves")
+    workspace.write_config(supported_extensions=[".stub", ".json"])
+    module = _batch_parser()
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    monkeypatch.setitem(parsers.PARSERS, ".stub", "stub_batch_parser")
+
+    run_indexing(full=True)
+
+    store = load_index(workspace.config)
+    texts = {store.filename(row).rsplit("/", 1)[-1]: store.text(row) for row in range(len(store))}
+    assert "zebra" in texts["photo.stub"]
+    assert "giraffes" in texts["notes.json"]
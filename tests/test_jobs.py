@@ -0,0 +1,69 @@
+import threading
+import time
+
+from backend.jobs import IndexJob, JobManager, JobStore
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _blocking_run(started, release):
+    def run(full=False, job=None):
+        started.set()
+        while not release.is_set():
+            job.check_cancelled()
+            job.report(files_total=10, files_parsed=3)
+            time.sleep(0.01)
+        return 3
+    return run
+
+
+def test_workers_sharing_a_store_see_and_cancel_each_others_jobs(tmp_path):
+    started, release = threading.Event(), threading.Event()
+    worker_a = JobManager(_blocking_run(started, release), store=JobStore(tmp_path))
+    worker_b = JobManager(_blocking_run(threading.Event(), release), store=JobStore(tmp_path))
+    try:
+        job, created = worker_a.submit()
+        assert created
+        started.wait(5)
+        _wait_for(lambda: worker_b.get(job.id).snapshot()["files_parsed"] == 3)
+        assert worker_b.get(job.id).state == "running"
+
+        running, created = worker_b.submit()
+        assert not created and running.id == job.id
+
+        worker_b.cancel(job.id)
+        _wait_for(lambda: worker_b.get(job.id).state == "cancelled")
+        assert worker_a.get(job.id).state == "cancelled"
+
+        _, created = worker_b.submit()
+        assert created
+    finally:
+        release.set()
+        worker_a.shutdown()
+        worker_b.shutdown()
+
+
+def test_job_of_a_dead_worker_is_reported_failed_and_does_not_block(tmp_path):
+    store = JobStore(tmp_path)
+    orphan = IndexJob()
+    orphan.state = "running"
+    store.save(orphan)  # saved as running, but nobody holds its lock
+
+    assert store.load(orphan.id).state == "failed"
+    manager = JobManager(lambda full=False, job=None: 0, store=store)
+    try:
+        _, created = manager.submit()
+        assert created
+    finally:
+        manager.shutdown()
+
+
+def test_unknown_or_malformed_job_ids_are_not_found(tmp_path):
+    store = JobStore(tmp_path)
+    assert store.load("0123456789ab") is None
+    assert store.load("../../config") is None
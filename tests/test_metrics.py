@@ -0,0 +1,15 @@
+from backend import metrics
+
+
+def test_series_carry_the_worker_label_when_set(monkeypatch):
+    monkeypatch.setattr(metrics, "_worker", None)
+    counter = metrics.Counter("test_total", "Test counter.", ["endpoint"])
+    counter.inc(endpoint="search")
+    assert 'test_total{endpoint="search"} 1' in counter.render()
+
+    metrics.set_worker(1234)
+    assert 'test_total{worker="1234",endpoint="search"} 1' in counter.render()
+
+    unlabelled = metrics.Counter("plain_total", "Test counter.")
+    unlabelled.inc()
+    assert 'plain_total{worker="1234"} 1' in unlabelled.render()
@@ -0,0 +1,88 @@
+import io
+import json
+
+import pytest
+
+from backend.parsers import html_parser, json_parser
+
+
+class TrickleFile(io.StringIO):
+    """A text file that returns at most `step` characters per read, to split values across buffers."""
+
+    def __init__(self, text, step=3):
+        super().__init__(text)
+        self.step = step
+
+    def read(self, size=-1):
+        return super().read(self.step if size < 0 else min(size, self.step))
+
+
+def _records(text, step=3):
+    return list(json_parser.iter_records(TrickleFile(text, step)))
+
+
+def test_array_elements_come_out_one_at_a_time_across_buffer_boundaries():
+    records = [{"id": i, "price": 12.5 + i, "tags": ["a", {"deep": [i, None, True]}], "name": "x" * i}
+               for i in range(20)]
+    for step in (1, 3, 7, 64):
+        assert _records(json.dumps(records), step) == records
+
+
+def test_numbers_split_by_a_buffer_are_read_whole():
+    numbers = [123456.789, -0.5, 1e-7, 42, 10000000000]
+    for step in range(1, 8):
+        assert _records(json.dumps(numbers), step) == numbers
+
+
+def test_object_members_come_out_as_one_key_objects():
+    document = {"first": {"nested": [1, 2]}, "second": "text", "third": []}
+    assert _records(json.dumps(document, indent=2)) == [{"first": {"nested": [1, 2]}}, {"second": "text"},
+                                                        {"third": []}]
+
+
+def test_scalar_and_empty_documents():
+    assert _records('"just a string"') == ["just a string"]
+    assert _records("  3.25  ") == [3.25]
+    assert _records("[]") == []
+    assert _records(" { } ") == []
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1}, {"b": ', '[1, 2', '{"a": 1 "b": 2}', '[{"a": 1}'])
+def test_truncated_or_malformed_input_raises(text):
+    with pytest.raises(ValueError):
+        _records(text)
+
+
+def test_truncated_input_yields_complete_records_before_failing():
+    records = json_parser.iter_records(TrickleFile('[{"a": 1}, {"b": 2}, {"c": '))
+    assert next(records) == {"a": 1}
+    assert next(records) == {"b": 2}
+    with pytest.raises(ValueError):
+        next(records)
+
+
+def test_json_sections_are_one_record_each(tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps([{"a": 1}, {"b": 2}]))
+    sections = list(json_parser.iter_sections(path))
+    assert [json.loads(text) for _, text in sections] == [{"a": 1}, {"b": 2}]
+    assert all(page is None for page, _ in sections)
+
+
+def test_html_sections_skip_scripts_and_styles_and_decode_entities(tmp_path, monkeypatch):
+    monkeypatch.setattr(html_parser, "READ_SIZE", 16)
+    monkeypatch.setattr(html_parser, "SECTION_CHARS", 40)
+    body = "".join(f"<p>Paragraph {i} &amp; giraffe{i}.</p> " for i in range(50))
+    path = tmp_path / "page.html"
+    path.write_text(f"<html><head><style>p {{ color: red }}</style><script>var a = '<p>';</script></head>"
+                    f"<body>{body}<script>hidden()</script></body></html>")
+
+    sections = [text for _, text in html_parser.iter_sections(path)]
+
+    text = "".join(sections)
+    assert len(sections) > 1
+    assert "color" not in text and "var a" not in text and "hidden" not in text
+    assert "Paragraph 0 & giraffe0." in text and "Paragraph 49 & giraffe49." in text
+    # Pieces are cut at whitespace, never inside a word.
+    assert all(section[-1].isspace() for section in sections[:-1] if section)
+    assert html_parser.parse(path) == text
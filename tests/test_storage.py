@@ -0,0 +1,111 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.storage import INDEX_FILE, LEGACY_INDEX_FILE, IndexWriter, load_index
+
+
+def _records(count, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"filename": f"/docs/file{i // 3}.pdf", "chunk_id": i % 3, "page": i % 3 + 1,
+             "text": f"chunk {i} – naïve café ✓", "embedding": rng.standard_normal(dim).tolist()}
+            for i in range(count)]
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _write(config, records, base=None):
+    writer = IndexWriter(config, base=base)
+    try:
+        writer.add(records)
+        return writer.commit()
+    except Exception:
+        writer.abort()
+        raise
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {"index_folder": str(tmp_path / "index"), "embedding_model": "test-model"}
+
+
+def test_segment_round_trip(config):
+    records = _records(10)
+    _write(config, records)
+
+    store = load_index(config)
+    assert (len(store), store.dim, store.version) == (10, 8, 1)
+    assert [store.record(i) for i in range(10)] == \
+        [{key: r[key] for key in ("filename", "chunk_id", "page", "text")} for r in records]
+    np.testing.assert_allclose(store.vectors, _unit([r["embedding"] for r in records]), rtol=1e-6)
+    assert [(e["path"], e["rows"]) for e in store.file_entries] == \
+        [(f"/docs/file{i}.pdf", [3 * i, min(3 * i + 3, 10)]) for i in range(4)]
+    assert store.info["model"] == "test-model"
+
+
+def test_float16_vectors_round_trip(config):
+    records = _records(4)
+    _write({**config, "vector_dtype": "float16"}, records)
+
+    store = load_index(config)
+    assert store.vectors.dtype == np.float16
+    np.testing.assert_allclose(store.vectors, _unit([r["embedding"] for r in records]), atol=1e-3)
+
+
+def test_appending_keeps_rows_and_publishes_a_new_version(config):
+    first, second = _records(6), _records(4, seed=1)
+    for r in second:
+        r["filename"] = r["filename"].replace("/docs/", "/more/")
+    _write(config, first)
+    base = load_index(config)
+    _write(config, second, base=base)
+
+    store = load_index(config)
+    assert store.version == 2 and store.info["segment"] == base.info["segment"]
+    assert [store.text(i) for i in range(10)] == [r["text"] for r in first + second]
+    np.testing.assert_allclose(store.vectors[6:], _unit([r["embedding"] for r in second]), rtol=1e-6)
+    # The version loaded before the append still reads only its own rows.
+    assert len(base) == 6 and base.text(5) == first[5]["text"]
+
+
+def test_rebuild_replaces_the_old_segment(config, tmp_path):
+    old = _write(config, _records(3))
+    new = _write(config, _records(2, seed=1))
+
+    assert new["segment"] != old["segment"] and new["version"] == 2
+    assert not list((tmp_path / "index").glob(f"{old['segment']}.*"))
+
+
+def test_aborted_write_publishes_nothing(config, tmp_path):
+    writer = IndexWriter(config)
+    writer.add(_records(3))
+    writer.abort()
+
+    assert load_index(config) is None
+    assert not list((tmp_path / "index").glob("seg-*"))
+
+
+def test_legacy_json_index_migrates_to_the_same_rows(config, tmp_path):
+    records = _records(25)
+    legacy = tmp_path / "index" / LEGACY_INDEX_FILE
+    legacy.parent.mkdir()
+    # The old format: one indented JSON list of chunk dicts; entries without an embedding are skipped.
+    legacy.write_text(json.dumps(records + [{"filename": "/docs/broken.pdf", "text": "no embedding"}], indent=2))
+
+    migrated = load_index(config)
+
+    expected_config = {**config, "index_folder": str(tmp_path / "expected")}
+    _write(expected_config, records)
+    expected = load_index(expected_config)
+    assert len(migrated) == len(expected) == 25
+    assert [migrated.record(i) for i in range(25)] == [expected.record(i) for i in range(25)]
+    np.testing.assert_array_equal(migrated.vectors, expected.vectors)
+    assert migrated.file_entries == expected.file_entries
+    assert (tmp_path / "index" / INDEX_FILE).exists() and legacy.exists()
+
+    # Migrated once: later loads open the binary index.
+    assert load_index(config).info["segment"] == migrated.info["segment"]